@@ -7,6 +7,19 @@ import scrapy
 
 
 class OtodomScraperItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+    link = scrapy.Field()
+    page_number = scrapy.Field()
+    Latitude = scrapy.Field()
+    Longitude = scrapy.Field()
+    # static fields and the dynamic details table, keyed by their names on the page
+    details = scrapy.Field()
+
+    # flat record, same shape as the rows in otodom_houses.json
+    def to_record(self):
+        return {
+            'link': self['link'],
+            'page_number': self['page_number'],
+            'Latitude': self['Latitude'],
+            'Longitude': self['Longitude'],
+            **self.get('details', {})
+        }
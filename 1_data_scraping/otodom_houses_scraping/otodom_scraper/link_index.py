@@ -0,0 +1,137 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+
+# persistent set of already scraped listing links, kept on disk in SQLite
+# so spider startup and memory don't grow with the size of the dataset
+class LinkIndex:
+    def __init__(self, file_path, commit_every=50):
+        self.file_path = file_path
+        self.commit_every = commit_every
+        self.pending = 0
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS links (link TEXT PRIMARY KEY, added_at TEXT) WITHOUT ROWID'
+        )
+        # state used to detect changes when a listing is revisited
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS listings ('
+            'link TEXT PRIMARY KEY, fingerprint TEXT, price INTEGER, etag TEXT, last_modified TEXT, '
+            "last_checked TEXT, status TEXT DEFAULT 'active', page_number INTEGER) WITHOUT ROWID"
+        )
+        # indexes created before page numbers were stored
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(listings)')]
+        if 'page_number' not in columns:
+            self.connection.execute('ALTER TABLE listings ADD COLUMN page_number INTEGER')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS price_history (link TEXT, price INTEGER, seen_at TEXT)'
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS price_history_link ON price_history (link)'
+        )
+        self.connection.commit()
+
+    def __contains__(self, link):
+        row = self.connection.execute('SELECT 1 FROM links WHERE link = ?', (link,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM links').fetchone()[0]
+
+    def add(self, link):
+        self.connection.execute(
+            'INSERT OR IGNORE INTO links (link, added_at) VALUES (?, ?)',
+            (link, datetime.now().isoformat(timespec='seconds'))
+        )
+        self.pending += 1
+
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def update(self, links):
+        added_at = datetime.now().isoformat(timespec='seconds')
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO links (link, added_at) VALUES (?, ?)',
+            ((link, added_at) for link in links)
+        )
+        self.commit()
+
+    def get_listing(self, link):
+        row = self.connection.execute(
+            'SELECT fingerprint, price, etag, last_modified, status, page_number FROM listings WHERE link = ?', (link,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('fingerprint', 'price', 'etag', 'last_modified', 'status', 'page_number'), row))
+
+    # store the current version of a listing, a price change adds a price history row.
+    # page_number is the results page the listing was first found on, it is kept when not given
+    def record_listing(self, link, fingerprint, price, etag=None, last_modified=None, page_number=None):
+        now = datetime.now().isoformat(timespec='seconds')
+        previous = self.get_listing(link)
+        if page_number is None and previous is not None:
+            page_number = previous['page_number']
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO listings '
+            '(link, fingerprint, price, etag, last_modified, last_checked, status, page_number) '
+            "VALUES (?, ?, ?, ?, ?, ?, 'active', ?)",
+            (link, fingerprint, price, etag, last_modified, now, page_number)
+        )
+        if previous is None or previous['price'] != price:
+            self.connection.execute(
+                'INSERT INTO price_history (link, price, seen_at) VALUES (?, ?, ?)', (link, price, now)
+            )
+        self.add(link)
+
+    def mark_checked(self, link, status='active'):
+        self.connection.execute(
+            'INSERT INTO listings (link, last_checked, status) VALUES (?, ?, ?) '
+            'ON CONFLICT (link) DO UPDATE SET last_checked = excluded.last_checked, status = excluded.status',
+            (link, datetime.now().isoformat(timespec='seconds'), status)
+        )
+        self.pending += 1
+
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    # active listings not checked for min_age_days, newest and most expensive first
+    def due_for_revisit(self, limit, min_age_days=7):
+        rows = self.connection.execute(
+            'SELECT l.link FROM links l LEFT JOIN listings s ON s.link = l.link '
+            "WHERE COALESCE(s.status, 'active') = 'active' "
+            "AND julianday('now', 'localtime') - julianday(COALESCE(s.last_checked, l.added_at)) >= ? "
+            'ORDER BY COALESCE(s.price, 0) '
+            "* (julianday('now', 'localtime') - julianday(COALESCE(s.last_checked, l.added_at))) "
+            "/ (1 + julianday('now', 'localtime') - julianday(l.added_at)) DESC "
+            'LIMIT ?',
+            (min_age_days, limit)
+        )
+        return [row[0] for row in rows]
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+# one-time import of links from the old otodom_houses.json
+def migrate_from_json(index, json_path):
+    if not os.path.exists(json_path):
+        return 0
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        existing_data = json.load(f)
+
+    links = [item['link'] for item in existing_data if 'link' in item]
+    index.update(links)
+    return len(links)
@@ -3,7 +3,24 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import queue
+import time
+import random
+
 from scrapy import signals
+from scrapy.http import HtmlResponse
+from scrapy.downloadermiddlewares.retry import get_retry_request
+from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.task import LoopingCall, deferLater
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -56,48 +73,303 @@ class OtodomScraperSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
+# Renders requests marked with meta["selenium"] in a pool of headless browsers.
+# Browsers are started and driven from a separate thread pool so the reactor is
+# never blocked and up to BROWSER_POOL_SIZE pages are rendered at the same time.
 class OtodomScraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    def __init__(self, pool_size=2, wait_timeout=10, page_load_timeout=30,
+                 max_pages_per_browser=200, scroll_pause=1, scroll_increment=0.3):
+        self.pool_size = pool_size
+        self.wait_timeout = wait_timeout
+        self.page_load_timeout = page_load_timeout
+        self.max_pages_per_browser = max_pages_per_browser
+        self.scroll_pause = scroll_pause
+        self.scroll_increment = scroll_increment
+
+        self.browsers = queue.Queue()
+        self.all_browsers = []
+        self.threadpool = ThreadPool(minthreads=1, maxthreads=pool_size, name="browser-pool")
+        self.stats = None
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        s = cls(
+            pool_size=settings.getint("BROWSER_POOL_SIZE", 2),
+            wait_timeout=settings.getfloat("BROWSER_WAIT_TIMEOUT", 10),
+            page_load_timeout=settings.getfloat("BROWSER_PAGE_LOAD_TIMEOUT", 30),
+            max_pages_per_browser=settings.getint("BROWSER_MAX_PAGES_PER_BROWSER", 200),
+            scroll_pause=settings.getfloat("BROWSER_SCROLL_PAUSE", 1),
+        )
+        s.stats = crawler.stats
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
-        return None
+        if not request.meta.get("selenium"):
+            return None
+
+        from twisted.internet import reactor
+        return deferToThreadPool(reactor, self.threadpool, self.render, request)
+
+    def process_response(self, request, response, spider):
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # the crashed browser was dropped from its slot, try the page again
+        if request.meta.get("selenium") and isinstance(exception, WebDriverException):
+            return get_retry_request(request, spider=spider, reason="browser_error")
+
+    def spider_opened(self, spider):
+        # empty slots, a browser is started by the first render that takes the slot
+        for _ in range(self.pool_size):
+            self.browsers.put(None)
+        self.threadpool.start()
+        spider.logger.info("Spider opened: %s, browser pool size: %d" % (spider.name, self.pool_size))
+
+    def spider_closed(self, spider):
+        self.threadpool.stop()
+        for browser in self.all_browsers:
+            self.quit_browser(browser)
+
+    def new_browser(self):
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument(
+            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        )
+        driver = webdriver.Chrome(options=chrome_options)
+        driver.set_page_load_timeout(self.page_load_timeout)
+        driver.pages_rendered = 0
+        self.all_browsers.append(driver)
+        return driver
+
+    def quit_browser(self, driver):
+        if driver in self.all_browsers:
+            self.all_browsers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    # runs in the browser thread pool
+    def render(self, request):
+        driver = self.browsers.get()
+        try:
+            if driver is None:
+                driver = self.new_browser()
+            driver.get(request.url)
+            self.scroll_and_wait(driver, request.meta.get("selenium_wait_for"))
+
+            response = HtmlResponse(
+                url=driver.current_url,
+                body=driver.page_source,
+                encoding="utf-8",
+                request=request
+            )
+            driver.pages_rendered += 1
+            self.inc_stat("browser/pages_rendered")
+        except WebDriverException:
+            # browser crashed, hung or could not be started, the next render
+            # that takes its slot starts a new one
+            self.inc_stat("browser/restarts")
+            if driver is not None:
+                self.quit_browser(driver)
+            driver = None
+            raise
+        finally:
+            # recycle long-running browsers to keep their memory usage bounded
+            if driver is not None and driver.pages_rendered >= self.max_pages_per_browser:
+                self.inc_stat("browser/recycled")
+                self.quit_browser(driver)
+                driver = None
+            self.browsers.put(driver)
+
+        return response
+
+    # scroll down the page until the awaited element is loaded
+    def scroll_and_wait(self, driver, wait_for=None):
+        total_height = driver.execute_script("return document.body.scrollHeight")
+        current_scroll_position = 0
+
+        while current_scroll_position < total_height:
+            if wait_for and driver.find_elements(By.CSS_SELECTOR, wait_for):
+                return
+
+            current_scroll_position += total_height * self.scroll_increment
+            driver.execute_script(f"window.scrollTo(0, {current_scroll_position});")
+            time.sleep(self.scroll_pause)
+            total_height = driver.execute_script("return document.body.scrollHeight")
+
+        if wait_for:
+            try:
+                WebDriverWait(driver, self.wait_timeout).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, wait_for))
+                )
+            except TimeoutException:
+                self.inc_stat("browser/wait_timeouts")
+
+    def inc_stat(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(key)
+
+
+# Adapts concurrency and delay of every host from observed latency and
+# 429/5xx rate, retries failed requests with jittered exponential backoff
+# and periodically reports crawl speed.
+class OtodomThrottleMiddleware:
+    BACKOFF_HTTP_CODES = {408, 429, 500, 502, 503, 504, 522, 524}
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+
+        self.max_concurrency = settings.getint("THROTTLE_MAX_CONCURRENCY", 16)
+        self.min_delay = settings.getfloat("THROTTLE_MIN_DELAY", 0.25)
+        self.max_delay = settings.getfloat("THROTTLE_MAX_DELAY", 30)
+        self.target_latency = settings.getfloat("THROTTLE_TARGET_LATENCY", 3)
+        self.error_threshold = settings.getfloat("THROTTLE_ERROR_THRESHOLD", 0.05)
+        self.adjust_every = settings.getint("THROTTLE_ADJUST_EVERY", 10)
+        self.backoff_base = settings.getfloat("RETRY_BACKOFF_BASE", 2)
+        self.backoff_max = settings.getfloat("RETRY_BACKOFF_MAX", 120)
+        self.log_interval = settings.getfloat("THROTTLE_LOG_INTERVAL", 60)
+
+        # per host: latency and error rate (moving averages), responses since last adjustment
+        self.hosts = {}
+        self.log_task = None
+        self.last_log = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        error = response.status in self.BACKOFF_HTTP_CODES
+        self.observe(request, error)
+        self.stats.inc_value("throttle/responses")
+
+        if (error and response.status not in request.meta.get("handle_httpstatus_list", [])
+                and not request.meta.get("dont_retry")):
+            retry_after = response.headers.get("Retry-After")
+            retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+            return self.retry(request, f"http_{response.status}", spider, retry_after) or response
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        if isinstance(exception, (IgnoreRequest, WebDriverException)):
+            return None
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+        self.observe(request, True)
+        if request.meta.get("dont_retry"):
+            return None
+        return self.retry(request, exception, spider)
+
+    def retry(self, request, reason, spider, retry_after=None):
+        retry_request = get_retry_request(request, spider=spider, reason=reason)
+        if retry_request is None:
+            self.stats.inc_value("throttle/gave_up")
+            return None
+
+        retry_times = retry_request.meta.get("retry_times", 1)
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (retry_times - 1))
+        # the site may ask for a longer wait than we are willing to hold a request for
+        backoff = min(self.backoff_max, retry_after) if retry_after else backoff * random.uniform(0.5, 1.5)
+        # latency of this attempt must not be counted again if the retry fails without a response
+        retry_request.meta.pop("download_latency", None)
+        self.stats.inc_value("throttle/backoff_seconds", backoff)
+
+        from twisted.internet import reactor
+        return deferLater(reactor, backoff, lambda: retry_request)
+
+    def host_key(self, request):
+        return request.meta.get("download_slot") or urlparse_cached(request).hostname or ""
+
+    def observe(self, request, error):
+        key = self.host_key(request)
+        host = self.hosts.setdefault(key, {"latency": None, "error_rate": 0.0, "responses": 0})
+
+        # set by the HTTP download handler only, so time spent rendering pages in the
+        # browser pool (or waiting for a free browser) is not taken for host latency
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            host["latency"] = latency if host["latency"] is None else 0.8 * host["latency"] + 0.2 * latency
+        host["error_rate"] = 0.8 * host["error_rate"] + 0.2 * (1 if error else 0)
+        host["responses"] += 1
+        if error:
+            self.stats.inc_value("throttle/errors")
+
+        # back off right away when the site tells us to slow down, otherwise adjust in steps
+        if error or host["responses"] >= self.adjust_every:
+            self.adjust(key, host)
+
+    def adjust(self, key, host):
+        host["responses"] = 0
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+
+        overloaded = host["error_rate"] > self.error_threshold or (
+            host["latency"] is not None and host["latency"] > self.target_latency
+        )
+        # with a delay Scrapy sends one request at a time, so concurrency only
+        # matters once the delay has dropped to 0
+        if overloaded:
+            if slot.concurrency > 1:
+                slot.concurrency = max(1, slot.concurrency // 2)
+            else:
+                slot.delay = min(self.max_delay, max(slot.delay * 2, self.min_delay))
+        elif slot.delay > 0:
+            slot.delay = slot.delay * 0.7 if slot.delay * 0.7 >= self.min_delay else 0
+        else:
+            slot.concurrency = min(self.max_concurrency, slot.concurrency + 1)
+
+        self.stats.set_value(f"throttle/{key}/concurrency", slot.concurrency)
+        self.stats.set_value(f"throttle/{key}/delay", round(slot.delay, 3))
 
     def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+        self.last_log = (time.monotonic(), 0, 0)
+        self.log_task = LoopingCall(self.log_stats, spider)
+        self.log_task.start(self.log_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.log_task is not None and self.log_task.running:
+            self.log_task.stop()
+
+    def log_stats(self, spider):
+        now = time.monotonic()
+        pages = self.stats.get_value("throttle/responses", 0)
+        listings = self.stats.get_value("item_scraped_count", 0)
+        errors = self.stats.get_value("throttle/errors", 0)
+
+        last_time, last_pages, last_listings = self.last_log
+        minutes = (now - last_time) / 60
+        pages_per_min = (pages - last_pages) / minutes
+        listings_per_min = (listings - last_listings) / minutes
+        error_rate = errors / pages if pages else 0
+        self.last_log = (now, pages, listings)
+
+        engine = self.crawler.engine
+        engine_slot = getattr(engine, "_slot", None) or getattr(engine, "slot", None)
+        queue_depth = len(engine_slot.scheduler) if engine_slot is not None else 0
+        in_progress = len(engine.downloader.active)
+
+        self.stats.set_value("throttle/pages_per_min", round(pages_per_min, 1))
+        self.stats.set_value("throttle/listings_per_min", round(listings_per_min, 1))
+        self.stats.set_value("throttle/error_rate", round(error_rate, 4))
+        self.stats.set_value("throttle/queue_depth", queue_depth)
+
+        concurrency = ", ".join(
+            f"{key}: {slot.concurrency} x {slot.delay:.2f}s" for key, slot in engine.downloader.slots.items()
+        )
+        print(
+            f"Strony/min: {pages_per_min:.1f} | Oferty/min: {listings_per_min:.1f} | "
+            f"Błędy: {error_rate:.1%} | Kolejka: {queue_depth} | W trakcie: {in_progress} | {concurrency}"
+        )
@@ -3,11 +3,46 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import os
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from otodom_scraper.items import OtodomScraperItem
+from otodom_scraper.storage import JsonLinesStorage, compact
 
+
+# appends every listing to results/otodom_houses.jsonl and merges it into
+# otodom_houses.json once, when the spider closes
 class OtodomScraperPipeline:
+    def __init__(self, results_dir, jsonl_file, json_file, fsync_every):
+        self.jsonl_path = os.path.join(results_dir, jsonl_file)
+        self.json_path = os.path.join(results_dir, json_file)
+        self.storage = JsonLinesStorage(self.jsonl_path, fsync_every=fsync_every)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            results_dir=settings.get('RESULTS_DIR'),
+            jsonl_file=settings.get('RESULTS_JSONL_FILE'),
+            json_file=settings.get('RESULTS_JSON_FILE'),
+            fsync_every=settings.getint('RESULTS_FSYNC_EVERY', 50)
+        )
+
+    def open_spider(self, spider):
+        self.storage.open()
+
     def process_item(self, item, spider):
+        if isinstance(item, OtodomScraperItem):
+            record = item.to_record()
+        else:
+            record = ItemAdapter(item).asdict()
+
+        self.storage.write(record)
+        spider.crawler.stats.inc_value('otodom/listings_saved')
         return item
+
+    def close_spider(self, spider):
+        self.storage.close()
+        compact(self.jsonl_path, self.json_path)
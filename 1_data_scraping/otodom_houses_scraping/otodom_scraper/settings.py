@@ -7,6 +7,8 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+
 BOT_NAME = "otodom_scraper"
 
 SPIDER_MODULES = ["otodom_scraper.spiders"]
@@ -19,11 +21,13 @@ NEWSPIDER_MODULE = "otodom_scraper.spiders"
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = False
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+# Starting delay and per host concurrency, adjusted during the crawl by OtodomThrottleMiddleware
 DOWNLOAD_DELAY = 1
 RANDOMIZE_DOWNLOAD_DELAY = True
+CONCURRENT_REQUESTS_PER_DOMAIN = 2
 LOG_LEVEL = 'WARNING'
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-CONCURRENT_REQUESTS = 2
+CONCURRENT_REQUESTS = 16
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -53,9 +57,46 @@ CONCURRENT_REQUESTS = 2
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "otodom_scraper.middlewares.OtodomScraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # retries are handled by OtodomThrottleMiddleware, with backoff
+    "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+    "otodom_scraper.middlewares.OtodomThrottleMiddleware": 540,
+    "otodom_scraper.middlewares.OtodomScraperDownloaderMiddleware": 543,
+}
+
+# Adaptive throttling per host (OtodomThrottleMiddleware)
+THROTTLE_MAX_CONCURRENCY = 16
+# delays below THROTTLE_MIN_DELAY are dropped to 0, then concurrency grows
+THROTTLE_MIN_DELAY = 0.25
+THROTTLE_MAX_DELAY = 30
+# slow down when average response time (seconds) or 429/5xx rate go above these
+THROTTLE_TARGET_LATENCY = 3
+THROTTLE_ERROR_THRESHOLD = 0.05
+# responses between adjustments
+THROTTLE_ADJUST_EVERY = 10
+# seconds between progress lines (pages/min, listings/min, error rate, queue depth)
+THROTTLE_LOG_INTERVAL = 60
+
+# Retries with jittered exponential backoff: RETRY_BACKOFF_BASE * 2^(attempt-1) seconds
+RETRY_TIMES = 5
+RETRY_BACKOFF_BASE = 2
+RETRY_BACKOFF_MAX = 120
+
+# Listings checked within this many days are not revisited (spider argument -a revisit=N)
+REVISIT_MIN_AGE_DAYS = 7
+
+# Render listing pages in the browser only when coordinates can't be read from the static html
+COORDINATES_BROWSER_FALLBACK = True
+
+# Headless browser pool used for requests with meta["selenium"]
+# (pages are rendered in parallel up to min(BROWSER_POOL_SIZE, CONCURRENT_REQUESTS))
+BROWSER_POOL_SIZE = 2
+# seconds to wait for meta["selenium_wait_for"] element after scrolling
+BROWSER_WAIT_TIMEOUT = 10
+BROWSER_PAGE_LOAD_TIMEOUT = 30
+# restart every browser after this many pages
+BROWSER_MAX_PAGES_PER_BROWSER = 200
+BROWSER_SCROLL_PAUSE = 1
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -65,9 +106,18 @@ CONCURRENT_REQUESTS = 2
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "otodom_scraper.pipelines.OtodomScraperPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "otodom_scraper.pipelines.OtodomScraperPipeline": 300,
+}
+
+# Output of the scraping stage (1_data_scraping/results)
+RESULTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../results"))
+# listings are appended here during the crawl...
+RESULTS_JSONL_FILE = "otodom_houses.jsonl"
+# ...and merged into this file (read by the cleaning stage) when the spider closes
+RESULTS_JSON_FILE = "otodom_houses.json"
+# fsync the JSON Lines file every N listings
+RESULTS_FSYNC_EVERY = 50
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
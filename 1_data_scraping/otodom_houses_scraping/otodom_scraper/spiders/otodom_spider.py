@@ -1,18 +1,14 @@
 import scrapy
 import os
 import json
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from scrapy.utils.project import get_project_settings
 from scrapy.http import HtmlResponse
-import time
 import re
+import hashlib
+from datetime import datetime
+from otodom_scraper.items import OtodomScraperItem
+from otodom_scraper.storage import read_json_lines
+from otodom_scraper.link_index import LinkIndex, migrate_from_json
 
 # Disable warnings in console
 import logging
@@ -21,41 +17,97 @@ LOGGER.setLevel(logging.WARNING)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
 
+GOOGLE_MAPS_LINK_SELECTOR = 'a[title*="Pokaż ten obszar w Mapach Google (otwiera się w nowym oknie)"]'
+
+
 class OtodomSpider(scrapy.Spider):
     name = 'otodom_spider'
     start_urls = ['https://www.otodom.pl/pl/wyniki/sprzedaz/dom/cala-polska?ownerTypeSingleSelect=ALL&viewType=listing&by=LATEST&direction=DESC&limit=72&page=1']
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, incremental=False, window=1, revisit=0, *args, **kwargs):
         super(OtodomSpider, self).__init__(*args, **kwargs)
-        self.properities = []
-        self.already_loaded_links = set()
+        # incremental mode: walk pages from the newest and stop at already known listings
+        self.incremental = str(incremental).lower() in ('1', 'true', 'yes')
+        self.window = int(window)
+        self.pages_count = 0
+        self.next_page = 1
+        self.reached_known_listings = False
+        self.pages_fetched = 0
+        self.newest_link = None
+        # number of already scraped listings to check again for changes
+        self.revisit = int(revisit)
+
+        self.already_loaded_links = None
         self.load_existing_data()
-        self.driver = self.init_webdriver()
-
-    def init_webdriver(self):
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        )
-        return webdriver.Chrome(options=chrome_options)
+        self.crawl_state = self.load_crawl_state()
+
+    def page_url(self, page_num):
+        return f'https://www.otodom.pl/pl/wyniki/sprzedaz/dom/cala-polska?ownerTypeSingleSelect=ALL&viewType=listing&by=LATEST&direction=DESC&limit=72&page={page_num}'
 
     def parse(self, response):
+        yield from self.revisit_requests()
+
         pages_count = self.get_pages_count(response)
         print(f"Liczba stron brana po uwagę: {pages_count}")
 
+        if self.incremental:
+            self.pages_count = pages_count
+            self.next_page = 2
+            # start response is page 1 already
+            yield from self.parse_page(response, page_num=1)
+            for _ in range(self.window - 1):
+                yield from self.schedule_next_page()
+            return
+
         for page_num in range(1, pages_count+1):
-            url = f'https://www.otodom.pl/pl/wyniki/sprzedaz/dom/cala-polska?ownerTypeSingleSelect=ALL&viewType=listing&by=LATEST&direction=DESC&limit=72&page={page_num}'
+            url = self.page_url(page_num)
             yield scrapy.Request(url, callback=self.parse_page, meta={'page_num': page_num})
 
-    def parse_page(self, response):
+    # conditional requests for known listings, most likely changed first
+    def revisit_requests(self):
+        if self.revisit <= 0:
+            return
+
+        min_age_days = self.settings.getfloat('REVISIT_MIN_AGE_DAYS', 7)
+        links = self.already_loaded_links.due_for_revisit(self.revisit, min_age_days)
+        print(f'Ponowne sprawdzenie {len(links)} ofert')
+
+        for link in links:
+            listing = self.already_loaded_links.get_listing(link) or {}
+            headers = {}
+            if listing.get('etag'):
+                headers['If-None-Match'] = listing['etag']
+            if listing.get('last_modified'):
+                headers['If-Modified-Since'] = listing['last_modified']
+
+            yield scrapy.Request(link, callback=self.parse_property, headers=headers, dont_filter=True, meta={
+                # page the listing was first found on, so the revisited record keeps it
+                'page_num': listing.get('page_number'),
+                'link': link,
+                'revisit': True,
+                'handle_httpstatus_list': [304, 404, 410]
+            })
+
+    def schedule_next_page(self):
+        if self.reached_known_listings or self.next_page > self.pages_count:
+            return
+
+        page_num = self.next_page
+        self.next_page += 1
+        yield scrapy.Request(self.page_url(page_num), callback=self.parse_page, meta={'page_num': page_num})
+
+    def parse_page(self, response, page_num=None):
         links = response.css('a[data-cy="listing-item-link"]::attr(href)').getall()
-        page_num = response.meta['page_num']
+        page_num = page_num or response.meta['page_num']
+        self.pages_fetched += 1
 
         print(f'Pobrano {len(links)} linków ze strony {page_num}')
 
+        if page_num == 1 and links:
+            self.newest_link = response.urljoin(links[0])
+
+        new_links_count = 0
+
         # check if offer is already scraped
         for link in links:
             url = response.urljoin(link)
@@ -63,45 +115,139 @@ class OtodomSpider(scrapy.Spider):
                 print(f'Zduplikowany link {url}, pominięto')
                 continue
             
+            new_links_count += 1
             yield scrapy.Request(url, callback=self.parse_property, meta={'page_num': page_num, 'link': url})
 
-    def parse_property(self, response):
-        self.driver.get(response.url)
+        if self.incremental:
+            high_water_link = self.crawl_state.get('newest_link')
+            if new_links_count == 0 or high_water_link in (response.urljoin(link) for link in links):
+                print(f'Strona {page_num} zawiera tylko znane oferty, kończenie przeglądania stron')
+                self.reached_known_listings = True
+            yield from self.schedule_next_page()
 
-        self.scroll_and_wait()
-    
-        # Load latitude and longitude
+    def parse_property(self, response):
+        rendered = response.meta.get('selenium', False)
+        link = response.meta['link']
+
+        if response.meta.get('revisit'):
+            if response.status == 304:
+                self.already_loaded_links.mark_checked(link)
+                self.crawler.stats.inc_value('otodom/revisit/not_modified')
+                return
+            if response.status in (404, 410):
+                self.already_loaded_links.mark_checked(link, status='delisted')
+                self.crawler.stats.inc_value('otodom/revisit/delisted')
+                return
+
+        details = self.get_property_details(response)
+        fingerprint = self.get_fingerprint(details)
+
+        # pages rendered by the browser are compared too: a listing first scraped with the
+        # browser may only match its stored fingerprint after rendering
+        if response.meta.get('revisit'):
+            # removed offers redirect to the search results
+            if details.get('Price') == "Brak informacji":
+                self.already_loaded_links.mark_checked(link, status='delisted')
+                self.crawler.stats.inc_value('otodom/revisit/delisted')
+                return
+
+            previous = self.already_loaded_links.get_listing(link)
+            if previous and previous['fingerprint'] == fingerprint:
+                self.already_loaded_links.mark_checked(link)
+                self.crawler.stats.inc_value('otodom/revisit/unchanged')
+                return
+
+        # Load latitude and longitude, from the static html when possible
         lat, long = "Brak informacji", "Brak informacji"
         try:
-            google_maps_link = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'a[title*="Pokaż ten obszar w Mapach Google (otwiera się w nowym oknie)"]'))
-            )
-            if google_maps_link:
-                href = google_maps_link.get_attribute("href")
-                match = re.search(r"ll=([0-9.\-]+),([0-9.\-]+)", href)
-                if match:
-                    lat = match.group(1)
-                    long = match.group(2)
+            coordinates = self.get_coordinates_from_page_state(response) or self.get_coordinates_from_map_link(response)
+            if coordinates:
+                lat, long = coordinates
 
         except Exception as e:
             print(f"Error extracting coordinates: {e}")
 
+        if lat == "Brak informacji" or long == "Brak informacji":
+            if not rendered and self.settings.getbool('COORDINATES_BROWSER_FALLBACK', True):
+                # rendered by the browser pool in OtodomScraperDownloaderMiddleware. Latency of
+                # the static download is left out, the throttle would count it again otherwise
+                meta = {key: value for key, value in response.meta.items() if key != 'download_latency'}
+                yield response.request.replace(dont_filter=True, meta={
+                    **meta,
+                    'selenium': True,
+                    'selenium_wait_for': GOOGLE_MAPS_LINK_SELECTOR
+                })
+                return
+            self.crawler.stats.inc_value('otodom/coordinates/missing')
+        else:
+            self.crawler.stats.inc_value('otodom/coordinates/browser' if rendered else 'otodom/coordinates/static')
+
+        # counted once, after a possible browser render
+        if response.meta.get('revisit'):
+            print(f'Zmiana w ofercie {link}')
+            self.crawler.stats.inc_value('otodom/revisit/changed')
+
         #load other property data
-        property_data = {
-            'link': response.meta['link'],
-            'page_number': response.meta['page_num'],
-            'Latitude': lat,
-            'Longitude': long,
-            **self.get_property_details(response)
-        }
+        item = OtodomScraperItem(
+            link=link,
+            page_number=response.meta['page_num'],
+            Latitude=lat,
+            Longitude=long,
+            details=details
+        )
 
-        print(f"Pobrano dane dla: {property_data['link']}, Latitude: {lat}, Longitude: {long}")
+        print(f"Pobrano dane dla: {item['link']}, Latitude: {lat}, Longitude: {long}")
 
         if lat == "Brak informacji" or long == "Brak informacji":
             print("Brak informacji o położeniu, oferta nie zostanie zapisana")
         else:
-            self.properities.append(property_data)
-            self.save_links_to_json()
+            # saved by OtodomScraperPipeline
+            self.already_loaded_links.record_listing(
+                link,
+                fingerprint,
+                self.parse_price(details.get('Price')),
+                etag=response.headers.get('ETag', b'').decode() or None,
+                last_modified=response.headers.get('Last-Modified', b'').decode() or None,
+                page_number=response.meta['page_num']
+            )
+            yield item
+
+    # coordinates from the Next.js page state embedded in the html
+    def get_coordinates_from_page_state(self, response):
+        page_state = response.css('script#__NEXT_DATA__::text').get()
+        if not page_state:
+            return None
+
+        try:
+            ad = json.loads(page_state)['props']['pageProps']['ad']
+            coordinates = ad['location']['coordinates']
+            lat, long = coordinates['latitude'], coordinates['longitude']
+        except (ValueError, KeyError, TypeError):
+            return None
+
+        if lat is None or long is None:
+            return None
+        return str(lat), str(long)
+
+    # coordinates from the "ll=lat,long" parameter of the Google Maps link
+    def get_coordinates_from_map_link(self, response):
+        href = response.css(f'{GOOGLE_MAPS_LINK_SELECTOR}::attr(href)').get()
+        if not href:
+            return None
+
+        match = re.search(r"ll=([0-9.\-]+),([0-9.\-]+)", href)
+        if not match:
+            return None
+        return match.group(1), match.group(2)
+
+    # hash of all scraped listing fields, used to detect changes on revisit
+    def get_fingerprint(self, details):
+        content = json.dumps(details, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def parse_price(self, price):
+        digits = re.sub(r"[^\d]", "", price or "")
+        return int(digits) if digits else None
 
     def get_property_details(self, response):
         details = self.get_static_details(response)
@@ -154,33 +300,65 @@ class OtodomSpider(scrapy.Spider):
         return dynamic_details
 
 
-    def save_links_to_json(self):
+    # links of scraped listings are kept in an on-disk index (results/links.sqlite)
+    def load_existing_data(self):
         base_dir = os.path.abspath(os.path.dirname(__file__))
         file_path = os.path.join(base_dir, '../../../results/otodom_houses.json')
+        jsonl_path = os.path.join(base_dir, '../../../results/otodom_houses.jsonl')
+        index_path = os.path.join(base_dir, '../../../results/links.sqlite')
 
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.properities, f, ensure_ascii=False, indent=1)
-                print(f'Zapisonao dane do otodom_houses.json, aktualna liczba nieruchomości to: {len(self.properities)}')
-        except Exception as e:
-            print(f'Błąd podczas zapisywania danych do pliku otodom_houses.json: {e}')
+        is_new_index = not os.path.exists(index_path)
+        self.already_loaded_links = LinkIndex(index_path)
+
+        # first run with the index, import links from the existing dataset
+        if is_new_index:
+            try:
+                migrated = migrate_from_json(self.already_loaded_links, file_path)
+                print(f'Zaimportowano {migrated} linków z pliku otodom_houses.json do indeksu')
+            except Exception as e:
+                print(f'Błąd podczas ładownaia danych z pliku otodom_houses.json: {e}')
 
+        # listings from a crawl that was interrupted before compaction
+        self.already_loaded_links.update(item['link'] for item in read_json_lines(jsonl_path))
 
-    def load_existing_data(self):
+        print(f'Załadowano istniejące dane: {len(self.already_loaded_links)} linków')
+
+    def crawl_state_path(self):
         base_dir = os.path.abspath(os.path.dirname(__file__))
-        file_path = os.path.join(base_dir, '../../../results/otodom_houses.json')
+        return os.path.join(base_dir, '../../../results/crawl_state.json')
 
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-                    self.already_loaded_links = {item['link'] for item in existing_data}
-                    self.properities = existing_data
+    def load_crawl_state(self):
+        file_path = self.crawl_state_path()
+        if not os.path.exists(file_path):
+            return {}
 
-                    print(f'Załadowano istniejące dane: {len(self.already_loaded_links)} linków')
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f'Błąd podczas ładowania stanu z pliku crawl_state.json: {e}')
+            return {}
+
+    # high-water mark for the next incremental run
+    def closed(self, reason):
+        # an interrupted run may have skipped older listings, keep the previous mark then
+        newest_link = self.newest_link if reason == 'finished' else None
+
+        state = {
+            'newest_link': newest_link or self.crawl_state.get('newest_link'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'finish_reason': reason,
+            'incremental': self.incremental,
+            'pages_fetched': self.pages_fetched
+        }
 
-            except Exception as e:
-                print(f'Błąd podczas ładownaia danych z pliku otodom_houses.json: {e}')
+        try:
+            with open(self.crawl_state_path(), 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=1)
+        except Exception as e:
+            print(f'Błąd podczas zapisywania stanu do pliku crawl_state.json: {e}')
+
+        self.already_loaded_links.close()
 
     def get_pages_count(self, response):
         page_numbers = response.css('ul[data-cy="frontend.search.base-pagination.nexus-pagination"] li.css-43nhzf::text').getall()
@@ -197,14 +375,3 @@ class OtodomSpider(scrapy.Spider):
         
     def is_duplicate(self, link):
         return link in self.already_loaded_links
-    
-    def scroll_and_wait(self, pause_time=1, increment=0.3):
-        total_height = self.driver.execute_script("return document.body.scrollHeight")
-        current_scroll_position = 0
-
-        while current_scroll_position < total_height:
-            current_scroll_position += total_height * increment
-            self.driver.execute_script(f"window.scrollTo(0, {current_scroll_position});")
-            time.sleep(pause_time)
-            total_height = self.driver.execute_script("return document.body.scrollHeight")
-
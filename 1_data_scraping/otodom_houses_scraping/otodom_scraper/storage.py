@@ -0,0 +1,127 @@
+import os
+import json
+
+
+# append-only JSON Lines storage, one listing per line
+class JsonLinesStorage:
+    def __init__(self, file_path, fsync_every=50):
+        self.file_path = file_path
+        self.fsync_every = fsync_every
+        self.file = None
+        self.written = 0
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        self.recover()
+        self.file = open(self.file_path, 'a', encoding='utf-8')
+
+    # cut off a partially written last line left by a crash
+    def recover(self):
+        if not os.path.exists(self.file_path):
+            return
+
+        with open(self.file_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+
+            # find the last complete line
+            position = size
+            chunk_size = 4096
+            tail = b''
+            while position > 0:
+                read_size = min(chunk_size, position)
+                position -= read_size
+                f.seek(position)
+                tail = f.read(read_size) + tail
+                if b'\n' in tail:
+                    break
+
+            last_newline = position + tail.rfind(b'\n') + 1 if b'\n' in tail else 0
+            if last_newline < size:
+                f.truncate(last_newline)
+                print(f'Usunięto niekompletny ostatni rekord z pliku {self.file_path}')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.written += 1
+
+        if self.written % self.fsync_every == 0:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is None:
+            return
+        self.sync()
+        self.file.close()
+        self.file = None
+
+
+def read_json_lines(file_path):
+    records = []
+    if not os.path.exists(file_path):
+        return records
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f'Pominięto uszkodzony rekord w pliku {file_path}')
+    return records
+
+
+# merge JSON Lines records into the JSON file read by the cleaning stage
+def compact(jsonl_path, json_path):
+    new_records = read_json_lines(jsonl_path)
+    if not new_records:
+        return 0
+
+    records = []
+    if os.path.exists(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+
+    index = {record['link']: i for i, record in enumerate(records)}
+    for record in new_records:
+        if record['link'] in index:
+            previous = records[index[record['link']]]
+            # revisits of listings without a known page number keep the stored one
+            if record.get('page_number') is None and previous.get('page_number') is not None:
+                record['page_number'] = previous['page_number']
+            records[index[record['link']]] = record
+        else:
+            index[record['link']] = len(records)
+            records.append(record)
+
+    # write to a temporary file and swap, so a crash never leaves a broken json
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, json_path)
+
+    # records are now in the json file
+    os.remove(jsonl_path)
+
+    print(f'Zapisano dane do {json_path}, aktualna liczba nieruchomości to: {len(records)}')
+    return len(new_records)
+
+
+if __name__ == '__main__':
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    compact(
+        os.path.join(settings.get('RESULTS_DIR'), settings.get('RESULTS_JSONL_FILE')),
+        os.path.join(settings.get('RESULTS_DIR'), settings.get('RESULTS_JSON_FILE'))
+    )
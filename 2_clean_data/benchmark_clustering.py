@@ -0,0 +1,99 @@
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from cleaning.clustering import cluster_locations
+
+# (latitude, longitude, spread in degrees, share of points) of the biggest listing areas
+CITIES = [
+    (52.23, 21.01, 0.15, 0.30),  # Warszawa
+    (50.06, 19.94, 0.10, 0.12),  # Kraków
+    (51.11, 17.03, 0.10, 0.10),  # Wrocław
+    (54.37, 18.64, 0.10, 0.08),  # Gdańsk
+    (52.41, 16.93, 0.08, 0.08),  # Poznań
+    (51.76, 19.46, 0.08, 0.07),  # Łódź
+    (50.26, 19.02, 0.12, 0.10),  # Katowice
+]
+POLAND_BOUNDS = ((49.0, 54.8), (14.1, 24.1))
+
+# settings compared in the benchmark, similar cluster sizes for every method
+CONFIGS = {
+    'dbscan': {'method': 'dbscan', 'eps': 0.05, 'min_samples': 5},
+    'dbscan_grid': {'method': 'dbscan', 'eps': 0.05, 'min_samples': 5, 'grid_cell': 0.01, 'n_jobs': -1},
+    'haversine': {'method': 'haversine', 'eps_km': 2.0, 'min_samples': 5},
+    'haversine_grid': {'method': 'haversine', 'eps_km': 2.0, 'min_samples': 5, 'grid_cell_km': 0.25},
+    'hdbscan_grid': {'method': 'hdbscan', 'min_cluster_size': 20, 'grid_cell_km': 1.0},
+}
+
+
+# dense gaussian blobs around cities on top of a uniform background
+def synthetic_locations(n_points, seed=0):
+    rng = np.random.default_rng(seed)
+    parts = []
+
+    for latitude, longitude, spread, share in CITIES:
+        n_city = int(n_points * share)
+        parts.append(rng.normal([latitude, longitude], spread, size=(n_city, 2)))
+
+    n_background = n_points - sum(len(part) for part in parts)
+    (lat_min, lat_max), (lon_min, lon_max) = POLAND_BOUNDS
+    parts.append(np.column_stack([
+        rng.uniform(lat_min, lat_max, n_background),
+        rng.uniform(lon_min, lon_max, n_background)
+    ]))
+
+    return pd.DataFrame(np.concatenate(parts), columns=['Latitude', 'Longitude'])
+
+
+def run_config(config, n_points, queue):
+    df = synthetic_locations(n_points)
+    start = time.perf_counter()
+    df = cluster_locations(df, **config)
+    runtime = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / 1024 ** 2 if sys.platform == 'darwin' else peak_rss / 1024
+    n_clusters = df['location_cluster'].max() + 1
+    noise = (df['location_cluster'] == -1).mean()
+    queue.put((runtime, peak_rss_mb, n_clusters, noise))
+
+
+# every run gets a fresh process, so peak memory is not shared between runs and
+# an out of memory kill only fails that run
+def benchmark(name, n_points, timeout):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_config, args=(CONFIGS[name], n_points, queue))
+    process.start()
+    process.join(timeout)
+
+    if process.is_alive():
+        process.kill()
+        process.join()
+        return f'{name:<16}{n_points:>10}  przekroczono limit czasu ({timeout} s)'
+    if process.exitcode != 0:
+        return f'{name:<16}{n_points:>10}  błąd, kod wyjścia {process.exitcode} (prawdopodobnie brak pamięci)'
+
+    runtime, peak_rss_mb, n_clusters, noise = queue.get()
+    return f'{name:<16}{n_points:>10}{runtime:>10.1f} s{peak_rss_mb:>10.0f} MB{n_clusters:>10}{noise:>9.1%}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark location clustering methods on synthetic data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50_000, 500_000, 2_000_000])
+    parser.add_argument('--methods', nargs='+', choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument('--timeout', type=int, default=1800, help='seconds per run')
+    args = parser.parse_args()
+
+    print(f'{"method":<16}{"points":>10}{"runtime":>12}{"peak RSS":>13}{"clusters":>10}{"noise":>9}')
+    for n_points in args.sizes:
+        for name in args.methods:
+            print(benchmark(name, n_points, args.timeout), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+import pandas as pd
+
+from cleaning.basic_cleaning import validate_and_fix_price_per_sqm
+
+
+# implementation replaced by the vectorized one, kept as the reference it must match
+def validate_and_fix_price_per_sqm_loop(df, price_col, price_per_sqm_col, area_col):
+    corrected_count = 0
+
+    for idx, row in df.iterrows():
+        price = row[price_col]
+        area = row[area_col]
+        price_per_sqm = row[price_per_sqm_col]
+
+        if not np.isnan(price) and not np.isnan(area) and area > 0:
+            calculated_price_per_sqm = price/area
+            if price_per_sqm is None or abs(calculated_price_per_sqm - price_per_sqm)>1:
+                df.at[idx, price_per_sqm_col] = calculated_price_per_sqm
+                corrected_count+=1
+
+    print(f"Count of corrected prices per square meter: {corrected_count}")
+    return df
+
+
+# listings with every case the function handles: missing prices and areas, zero
+# areas, price per sqm that is correct, off by less or more than 1, NaN or None,
+# and an index that is neither sorted nor a range. With none_values the price per
+# sqm column is of object type and holds None, otherwise it is float with NaN.
+def synthetic_listings(n_rows, none_values=True, seed=0):
+    rng = np.random.default_rng(seed)
+    price = rng.uniform(100_000, 3_000_000, n_rows).round()
+    area = rng.uniform(40, 400, n_rows).round(1)
+    price_per_sqm = price / area + rng.choice([0.0, 0.5, -0.9, 25.0, -300.0], n_rows)
+
+    price[rng.random(n_rows) < 0.05] = np.nan
+    area[rng.random(n_rows) < 0.05] = np.nan
+    area[rng.random(n_rows) < 0.02] = 0
+    price_per_sqm[rng.random(n_rows) < 0.05] = np.nan
+
+    df = pd.DataFrame({'Price': price, 'Area': area, 'Price per sqm': price_per_sqm},
+                      index=rng.permutation(n_rows) * 3)
+    if none_values:
+        df['Price per sqm'] = df['Price per sqm'].astype(object)
+        df.loc[rng.random(n_rows) < 0.05, 'Price per sqm'] = None
+    return df
+
+
+def run(function, df):
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        df = function(df, 'Price', 'Price per sqm', 'Area')
+    return df, output.getvalue(), time.perf_counter() - start
+
+
+# checks that the vectorized function gives the same frame and the same printed count
+# as the loop it replaced, then compares their runtimes. Exits with an error on a mismatch.
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark validate_and_fix_price_per_sqm')
+    parser.add_argument('--rows', type=int, default=300_000)
+    args = parser.parse_args()
+
+    print(f'{"price per sqm":<16}{"rows":>10}{"corrected":>11}{"loop":>10}{"vectorized":>12}{"speedup":>9}')
+    for none_values in [True, False]:
+        df = synthetic_listings(args.rows, none_values)
+        expected, expected_output, loop_time = run(validate_and_fix_price_per_sqm_loop, df.copy())
+        result, output, vectorized_time = run(validate_and_fix_price_per_sqm, df.copy())
+
+        pd.testing.assert_frame_equal(result, expected)
+        assert output == expected_output, f'{output!r} != {expected_output!r}'
+
+        corrected = int(output.split(':')[1])
+        column_type = 'with None' if none_values else 'float'
+        print(f'{column_type:<16}{args.rows:>10}{corrected:>11}{loop_time:>9.2f}s{vectorized_time:>11.3f}s'
+              f'{loop_time / vectorized_time:>8.0f}x')
+    print('Vectorized output matches the loop')
+
+
+if __name__ == '__main__':
+    main()
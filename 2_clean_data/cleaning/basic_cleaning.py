@@ -111,18 +111,23 @@ def coordinates_to_numeric(df, lat_col, long_col):
     return df
 
 def validate_and_fix_price_per_sqm(df, price_col, price_per_sqm_col, area_col):
-    corrected_count = 0
+    price = df[price_col].to_numpy(dtype=float)
+    area = df[area_col].to_numpy(dtype=float)
+    price_per_sqm = pd.to_numeric(df[price_per_sqm_col], errors="coerce").to_numpy(dtype=float)
+    # only None is treated as missing, NaN fails the comparison below and is kept
+    is_none = df[price_per_sqm_col].to_numpy(dtype=object) == None
 
-    for idx, row in df.iterrows():
-        price = row[price_col]
-        area = row[area_col]
-        price_per_sqm = row[price_per_sqm_col]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        calculated_price_per_sqm = price / area
 
-        if not np.isnan(price) and not np.isnan(area) and area > 0:
-            calculated_price_per_sqm = price/area
-            if price_per_sqm is None or abs(calculated_price_per_sqm - price_per_sqm)>1:
-                df.at[idx, price_per_sqm_col] = calculated_price_per_sqm
-                corrected_count+=1
+    valid = ~np.isnan(price) & ~np.isnan(area) & (area > 0)
+    to_correct = valid & (is_none | (np.abs(calculated_price_per_sqm - price_per_sqm) > 1))
+    corrected_count = int(to_correct.sum())
+
+    if corrected_count:
+        if pd.api.types.is_numeric_dtype(df[price_per_sqm_col]):
+            df[price_per_sqm_col] = df[price_per_sqm_col].astype(float)
+        df.iloc[np.flatnonzero(to_correct), df.columns.get_loc(price_per_sqm_col)] = calculated_price_per_sqm[to_correct]
 
     print(f"Count of corrected prices per square meter: {corrected_count}")
     return df
@@ -169,4 +174,24 @@ def drop_columns_by_name(df, columns_to_drop=[]):
         print(f"Columns not found: {missing_columns}")
     
     df = df.drop(columns=[col for col in columns_to_drop if col in df.columns], errors="ignore")
-    return df
\ No newline at end of file
+    return df
+
+
+# cleaning of new listings to be valued, the steps of the training data that don't
+# need a price. Columns that are already numeric are only converted, rows missing
+# a model input are removed (the index tells which rows are left).
+def clean_listings(df, renamed_columns,
+                   required_columns=['Area', 'Land area', 'Rooms count', 'Latitude', 'Longitude']):
+    df = df.rename(columns=renamed_columns)
+
+    for column_name, clean in [('Area', clean_area), ('Land area', clean_area), ('Rooms count', clear_room_count)]:
+        if column_name in df and not pd.api.types.is_numeric_dtype(df[column_name]):
+            df = clean(df, column_name)
+        elif column_name in df:
+            df[column_name] = pd.to_numeric(df[column_name], errors='coerce')
+
+    if 'Address' in df:
+        df = get_voivodeship_from_localization(df, 'Address')
+    df = coordinates_to_numeric(df, 'Latitude', 'Longitude')
+    df = treat_custom_nulls(df, ['Brak informacji', 'brak informacji'])
+    return remove_null_rows(df, required_columns)
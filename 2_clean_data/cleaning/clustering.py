@@ -1,14 +1,145 @@
-from sklearn.cluster import DBSCAN
+from sklearn.cluster import DBSCAN, HDBSCAN
 from sklearn.preprocessing import StandardScaler
+import numpy as np
 import pandas as pd
 
-def cluster_locations_dbscan(df, eps=0.1, min_samples=5):
+EARTH_RADIUS_KM = 6371.0088
+DEGREES_PER_RADIAN = 180 / np.pi
+# rough size of one degree of latitude, used for grid cells given in km
+KM_PER_DEGREE = 111.2
+
+
+# points that fall into the same grid cell are replaced by one point at the cell
+# centroid, weighted by the number of points. Keeps DBSCAN neighborhoods small in
+# dense areas at the cost of moving points by at most one cell diagonal.
+def bucket_to_grid(points, cell_size):
+    cells = np.floor(points / cell_size).astype(np.int64)
+    unique_cells, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+
+    centroids = np.zeros((len(unique_cells), points.shape[1]))
+    np.add.at(centroids, inverse.ravel(), points)
+    centroids /= counts[:, None]
+
+    return centroids, inverse.ravel(), counts
+
+
+def run_dbscan(points, eps, min_samples, metric, grid_cell, n_jobs):
+    weights = None
+    inverse = None
+    if grid_cell:
+        points, inverse, weights = bucket_to_grid(points, grid_cell)
+
+    algorithm = 'ball_tree' if metric == 'haversine' else 'auto'
+    dbscan = DBSCAN(eps=eps, min_samples=min_samples, metric=metric, algorithm=algorithm, n_jobs=n_jobs)
+    labels = dbscan.fit_predict(points, sample_weight=weights)
+
+    core_points = dbscan.components_
+    core_labels = labels[dbscan.core_sample_indices_]
+    if inverse is not None:
+        labels = labels[inverse]
+
+    return labels, core_points, core_labels
+
+
+def cluster_locations_dbscan(df, eps=0.1, min_samples=5, grid_cell=None, n_jobs=None, return_model=False):
     features = ['Latitude', 'Longitude']
 
     scaler = StandardScaler()
     scaled_data = scaler.fit_transform(df[features])
 
-    dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-    df['location_cluster'] = dbscan.fit_predict(scaled_data)
+    labels, core_points, core_labels = run_dbscan(scaled_data, eps, min_samples, 'euclidean', grid_cell, n_jobs)
+    df['location_cluster'] = labels
+
+    if not return_model:
+        return df
+
+    # everything needed to assign new points to the fitted clusters
+    model = {
+        'method': 'dbscan',
+        'metric': 'euclidean',
+        'eps': eps,
+        'min_samples': min_samples,
+        'scaler_mean': scaler.mean_.tolist(),
+        'scaler_scale': scaler.scale_.tolist(),
+        'core_points': core_points,
+        'core_labels': core_labels
+    }
+    return df, model
+
+
+# DBSCAN on the sphere, eps_km is a real distance in kilometers
+def cluster_locations_haversine(df, eps_km=1.0, min_samples=5, grid_cell_km=None, n_jobs=-1, return_model=False):
+    points = np.radians(df[['Latitude', 'Longitude']].to_numpy(dtype=np.float64))
+    eps = eps_km / EARTH_RADIUS_KM
+    grid_cell = np.radians(grid_cell_km / KM_PER_DEGREE) if grid_cell_km else None
+
+    labels, core_points, core_labels = run_dbscan(points, eps, min_samples, 'haversine', grid_cell, n_jobs)
+    df['location_cluster'] = labels
+
+    if not return_model:
+        return df
+
+    # scaling by degrees per radian turns degrees into the radians used by the tree
+    model = {
+        'method': 'haversine',
+        'metric': 'haversine',
+        'eps': eps,
+        'min_samples': min_samples,
+        'scaler_mean': [0.0, 0.0],
+        'scaler_scale': [DEGREES_PER_RADIAN, DEGREES_PER_RADIAN],
+        'core_points': core_points,
+        'core_labels': core_labels
+    }
+    return df, model
+
+
+# HDBSCAN with haversine distance, new points get the label of the nearest
+# clustered point within assign_radius_km
+def cluster_locations_hdbscan(df, min_cluster_size=5, min_samples=None, assign_radius_km=1.0, grid_cell_km=None,
+                              n_jobs=-1, return_model=False):
+    points = np.radians(df[['Latitude', 'Longitude']].to_numpy(dtype=np.float64))
+
+    inverse = None
+    if grid_cell_km:
+        # HDBSCAN takes no sample weights, densities are estimated on the cell centroids
+        points, inverse, _ = bucket_to_grid(points, np.radians(grid_cell_km / KM_PER_DEGREE))
+
+    # 'auto' picks a ball tree, the only tree supporting haversine
+    hdbscan = HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples, metric='haversine',
+                      algorithm='auto', n_jobs=n_jobs, copy=True)
+    labels = hdbscan.fit_predict(points)
+
+    clustered = labels >= 0
+    core_points = points[clustered]
+    core_labels = labels[clustered]
+    df['location_cluster'] = labels[inverse] if inverse is not None else labels
+
+    if not return_model:
+        return df
+
+    model = {
+        'method': 'hdbscan',
+        'metric': 'haversine',
+        'eps': assign_radius_km / EARTH_RADIUS_KM,
+        'min_samples': min_samples,
+        'min_cluster_size': min_cluster_size,
+        'scaler_mean': [0.0, 0.0],
+        'scaler_scale': [DEGREES_PER_RADIAN, DEGREES_PER_RADIAN],
+        'core_points': core_points,
+        'core_labels': core_labels
+    }
+    return df, model
+
+
+CLUSTERING_METHODS = {
+    'dbscan': cluster_locations_dbscan,
+    'haversine': cluster_locations_haversine,
+    'hdbscan': cluster_locations_hdbscan
+}
+
+
+def cluster_locations(df, method='dbscan', return_model=False, **params):
+    if method not in CLUSTERING_METHODS:
+        raise ValueError(f"Unknown clustering method '{method}', available: {list(CLUSTERING_METHODS)}")
 
-    return df
\ No newline at end of file
+    return CLUSTERING_METHODS[method](df, return_model=return_model, **params)
@@ -1,4 +1,7 @@
+import json
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.preprocessing import MultiLabelBinarizer
 
 def encode_multilabel_column(df, col_name, prefix):
@@ -12,4 +15,65 @@ def encode_multilabel_column(df, col_name, prefix):
     binarized = mlb.fit_transform(df[col_name])
     binarized_df = pd.DataFrame(binarized, columns=[f"{prefix} {label}" for label in mlb.classes_], index=df.index)
 
-    return pd.concat([df, binarized_df], axis=1)
\ No newline at end of file
+    return pd.concat([df, binarized_df], axis=1)
+
+
+# one-hot encodes many ", "-separated multilabel columns at once.
+# column_prefixes maps column name -> prefix of the created columns,
+# vocabulary maps column name -> sorted list of labels (fitted when not given,
+# labels missing from a given vocabulary are ignored)
+def multilabel_matrix(df, column_prefixes, vocabulary=None):
+    missing_columns = [col for col in column_prefixes if col not in df]
+    if missing_columns:
+        raise ValueError(f"Columns {missing_columns} not found in DataFrame")
+
+    fitted_vocabulary = {}
+    blocks = []
+    feature_names = []
+
+    for col_name, prefix in column_prefixes.items():
+        values = df[col_name]
+        values = values.where(values != 'brak informacji').fillna('').astype(str)
+        labels = values.str.split(', ').reset_index(drop=True).explode()
+
+        if vocabulary is None:
+            classes = sorted(labels.unique())
+        else:
+            classes = list(vocabulary[col_name])
+
+        codes = pd.Categorical(labels, categories=classes).codes
+        known = codes >= 0
+        rows = labels.index.to_numpy()[known]
+        block = sparse.csr_matrix(
+            (np.ones(known.sum(), dtype=np.uint8), (rows, codes[known])),
+            shape=(len(df), len(classes))
+        )
+        # a label repeated in one row is still a single 1
+        block.sum_duplicates()
+        block.data[:] = 1
+
+        blocks.append(block)
+        fitted_vocabulary[col_name] = classes
+        feature_names.extend(f"{prefix} {label}" for label in classes)
+
+    matrix = sparse.hstack(blocks, format='csr', dtype=np.uint8)
+    return matrix, feature_names, fitted_vocabulary
+
+
+# same columns as calling encode_multilabel_column for every column, built in one pass
+# as a single uint8 block and added to the DataFrame with one concat
+def encode_multilabel_columns(df, column_prefixes, vocabulary=None):
+    matrix, feature_names, fitted_vocabulary = multilabel_matrix(df, column_prefixes, vocabulary)
+
+    encoded_df = pd.DataFrame(matrix.toarray(), columns=feature_names, index=df.index)
+    return pd.concat([df, encoded_df], axis=1), fitted_vocabulary
+
+
+def save_vocabulary(vocabulary, file_path):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(vocabulary, f, ensure_ascii=False, indent=1)
+
+
+def load_vocabulary(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
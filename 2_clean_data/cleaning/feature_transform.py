@@ -0,0 +1,63 @@
+import json
+import os
+import numpy as np
+from datetime import datetime
+
+# bump when the structure of feature_transform.json changes
+FEATURE_TRANSFORM_VERSION = 1
+
+
+# everything needed to turn a raw listing into the model input row:
+# column order, one-hot vocabularies, derived features and location clusters.
+# renamed_columns and multilabel_columns are kept to read raw scraped listings.
+# Read by streamlit_app/util_functions/feature_transform.py, the only code that
+# builds model input from it.
+def build_feature_transform(df, target, multilabel_columns, vocabulary, derived_features, location_model,
+                            renamed_columns=None):
+    feature_columns = [col for col in df.columns if col != target]
+
+    # only labels whose columns survived cleaning, keyed by column prefix
+    multilabel_features = {}
+    for col_name, prefix in multilabel_columns.items():
+        labels = [label for label in vocabulary[col_name] if f"{prefix} {label}" in feature_columns]
+        if labels:
+            multilabel_features[prefix] = labels
+
+    # remaining columns are taken from the listing as they are
+    encoded_columns = {f"{prefix} {label}" for prefix, labels in multilabel_features.items() for label in labels}
+    numeric_features = [
+        col for col in feature_columns
+        if col not in encoded_columns and col not in derived_features and col != 'location_cluster'
+    ]
+
+    return {
+        'version': FEATURE_TRANSFORM_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'target': target,
+        'feature_columns': feature_columns,
+        'numeric_features': numeric_features,
+        'multilabel_features': multilabel_features,
+        'derived_features': derived_features,
+        'raw_columns': {'renamed': renamed_columns or {}, 'multilabel': multilabel_columns},
+        'location_cluster': {
+            'feature': 'location_cluster',
+            'method': location_model.get('method', 'dbscan'),
+            'metric': location_model.get('metric', 'euclidean'),
+            'eps': location_model['eps'],
+            'min_samples': location_model['min_samples'],
+            'scaler_mean': location_model['scaler_mean'],
+            'scaler_scale': location_model['scaler_scale'],
+            'core_points_file': 'location_clusters.npz'
+        }
+    }
+
+
+def save_feature_transform(transform, location_model, results_dir='results'):
+    with open(os.path.join(results_dir, 'feature_transform.json'), 'w', encoding='utf-8') as f:
+        json.dump(transform, f, ensure_ascii=False, indent=1)
+
+    np.savez_compressed(
+        os.path.join(results_dir, transform['location_cluster']['core_points_file']),
+        core_points=location_model['core_points'].astype(np.float32),
+        core_labels=location_model['core_labels'].astype(np.int32)
+    )
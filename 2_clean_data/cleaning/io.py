@@ -17,4 +17,40 @@ def save_to_csv(df, file_paths=['result/otodom_houses_cleaned.csv'], separator='
         try:
             df.to_csv(file_path, sep=separator, index=False)
         except Exception as e:
-            print(f"Błąd podczas zapisywania pliku {file_path}: {e}")
\ No newline at end of file
+            print(f"Błąd podczas zapisywania pliku {file_path}: {e}")
+
+
+# compact column types: 0/1 columns -> uint8, integers -> smallest int type,
+# floats -> float32, text -> category. Columns in keep_float64 keep full precision.
+def optimize_dtypes(df, keep_float64=['Price']):
+    df = df.copy()
+
+    for column in df.columns:
+        values = df[column]
+
+        if column in keep_float64:
+            df[column] = values.astype('float64')
+        elif pd.api.types.is_bool_dtype(values):
+            df[column] = values.astype('uint8')
+        elif pd.api.types.is_numeric_dtype(values):
+            if pd.api.types.is_integer_dtype(values) and values.isin([0, 1]).all():
+                df[column] = values.astype('uint8')
+            elif pd.api.types.is_integer_dtype(values):
+                df[column] = pd.to_numeric(values, downcast='integer')
+            else:
+                df[column] = values.astype('float32')
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            df[column] = values.astype('category')
+
+    return df
+
+
+def save_to_parquet(df, file_paths=['results/otodom_houses_cleaned.parquet']):
+    df = optimize_dtypes(df)
+
+    for file_path in file_paths:
+        try:
+            df.to_parquet(file_path, index=False, engine='pyarrow')
+        except Exception as e:
+            print(f"Błąd podczas zapisywania pliku {file_path}: {e}")
+
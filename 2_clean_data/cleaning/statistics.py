@@ -1,4 +1,16 @@
+import json
+import os
+import numpy as np
 import pandas as pd
+from datetime import datetime
+from scipy.stats import gaussian_kde
+
+# bump when files of the statistics store change
+STATISTICS_VERSION = 2
+PREVIEW_ROWS = 50
+PRICE_HISTOGRAM_BINS = 30
+# the price density curve is estimated on a sample, it is only drawn over the histogram
+KDE_SAMPLE_SIZE = 50_000
 
 def dataframe_statistics(df, exclude_columns=[]):
     if not isinstance(df, pd.DataFrame):
@@ -35,4 +47,104 @@ def dataframe_statistics(df, exclude_columns=[]):
         else:
             print("Other data type")
 
-        print("-" * 40)
\ No newline at end of file
+        print("-" * 40)
+
+
+def price_histogram(prices, bins=PRICE_HISTOGRAM_BINS, random_state=42):
+    prices = prices.dropna().to_numpy(dtype=np.float64)
+    counts, edges = np.histogram(prices, bins=bins)
+
+    sample = prices
+    if len(prices) > KDE_SAMPLE_SIZE:
+        sample = np.random.default_rng(random_state).choice(prices, KDE_SAMPLE_SIZE, replace=False)
+    grid = np.linspace(edges[0], edges[-1], 200)
+    # density scaled to the histogram counts, like seaborn's kde=True
+    kde = gaussian_kde(sample)(grid) * len(prices) * (edges[1] - edges[0])
+
+    return {
+        "counts": counts.tolist(),
+        "edges": edges.tolist(),
+        "kde_x": grid.tolist(),
+        "kde_y": kde.tolist()
+    }
+
+
+# listings, mean and median price and mean price per sqm of every one-hot column in
+# one pass. Rows are ordered by price and the one-hot matrix is transposed, so its
+# nonzero entries come grouped by column with prices ascending: weighted bincounts over
+# them are the transposed matrix times the price vector, and medians are read from the
+# middle of each group.
+def onehot_aggregates(df, columns, target='Price', area='Area'):
+    prices = df[target].to_numpy(dtype=np.float64)
+    order = np.argsort(prices, kind='stable')
+    onehot_t = df[columns].to_numpy(dtype=np.uint8).T[:, order]
+    group, position = np.nonzero(onehot_t)
+    group_prices = prices[order][position]
+
+    n_columns = len(columns)
+    counts = np.bincount(group, minlength=n_columns)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if area in df:
+            price_per_sqm = (prices / df[area].to_numpy(dtype=np.float64))[order][position]
+        else:
+            price_per_sqm = np.full(len(position), np.nan)
+        valid = np.isfinite(price_per_sqm)
+
+        mean_price = np.bincount(group, weights=group_prices, minlength=n_columns) / counts
+        mean_price_per_sqm = (
+            np.bincount(group[valid], weights=price_per_sqm[valid], minlength=n_columns)
+            / np.bincount(group[valid], minlength=n_columns)
+        )
+
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    median_price = np.full(n_columns, np.nan)
+    filled = counts > 0
+    lower = starts[filled] + (counts[filled] - 1) // 2
+    upper = starts[filled] + counts[filled] // 2
+    median_price[filled] = (group_prices[lower] + group_prices[upper]) / 2
+
+    return pd.DataFrame({
+        "Feature": columns,
+        "Count": counts,
+        "Average Price": mean_price,
+        "Median Price": median_price,
+        "Average Price per sqm": mean_price_per_sqm
+    })
+
+
+# onehot_aggregates of every one-hot column of the given prefixes
+def feature_group_statistics(df, prefixes, target='Price'):
+    prefix_of = {col: prefix for prefix in prefixes for col in df.columns if col.startswith(f"{prefix} ")}
+    statistics = onehot_aggregates(df, list(prefix_of), target)
+    statistics.insert(0, "Prefix", statistics["Feature"].map(prefix_of))
+    return statistics
+
+
+# small summary files the dataset explorer page renders from, so it never loads the
+# raw or cleaned data: previews, describe(), correlation matrix, price histogram and
+# per-feature counts and prices
+def save_statistics(df, raw_preview, raw_rows, prefixes, target='Price', results_dir='results/stats'):
+    os.makedirs(results_dir, exist_ok=True)
+    numeric = df.select_dtypes(include=[np.number])
+
+    raw_preview.head(PREVIEW_ROWS).astype(str).to_parquet(os.path.join(results_dir, 'raw_preview.parquet'), index=False)
+    df.head(PREVIEW_ROWS).to_parquet(os.path.join(results_dir, 'cleaned_preview.parquet'), index=False)
+    df.describe().to_parquet(os.path.join(results_dir, 'describe.parquet'))
+    numeric.corr().to_parquet(os.path.join(results_dir, 'correlation.parquet'))
+    feature_group_statistics(df, prefixes, target).to_parquet(
+        os.path.join(results_dir, 'feature_groups.parquet'), index=False
+    )
+
+    # written last, the app reloads the store when its modification time changes
+    summary = {
+        "version": STATISTICS_VERSION,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "raw_rows": raw_rows,
+        "cleaned_rows": len(df),
+        "target": target,
+        "prefixes": list(prefixes),
+        "price_histogram": price_histogram(df[target])
+    }
+    with open(os.path.join(results_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
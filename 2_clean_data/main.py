@@ -1,11 +1,30 @@
-from cleaning.io import read_json_to_df, save_to_csv
+from cleaning.io import read_json_to_df, save_to_csv, save_to_parquet
 from cleaning.basic_cleaning import *
-from cleaning.encoding import encode_multilabel_column
-from cleaning.clustering import cluster_locations_dbscan
-from cleaning.statistics import dataframe_statistics
+from cleaning.encoding import encode_multilabel_columns, save_vocabulary
+from cleaning.clustering import cluster_locations
+from cleaning.feature_transform import build_feature_transform, save_feature_transform
+from cleaning.statistics import PREVIEW_ROWS, dataframe_statistics, save_statistics
+
+# new features, name: [numerator, denominator]
+DERIVED_FEATURES = {
+    "Area_per_room": ["Area", "Rooms count"],
+    "Building_density": ["Area", "Land area"],
+    "Area_to_rooms_ratio": ["Land area", "Rooms count"]
+}
+
+# method: 'dbscan' (standardized lat/long), 'haversine' (eps_km in km) or 'hdbscan',
+# grid_cell / grid_cell_km pre-buckets points for large datasets
+LOCATION_CLUSTERING = {
+    "method": "dbscan",
+    "eps": 0.05,
+    "min_samples": 2
+}
 
 def main():
     otodom_houses = read_json_to_df('../1_data_scraping/results/otodom_houses.json')
+    # only the size and first rows of the raw data are kept for the statistics
+    raw_rows = len(otodom_houses)
+    raw_preview = otodom_houses.head(PREVIEW_ROWS).copy()
 
     # rename columns
     column_mapping = {
@@ -31,27 +50,31 @@ def main():
     otodom_houses = remove_null_rows(otodom_houses, ['Price', 'Area', 'Land area', 'voivodeship', 'Latitude', 'Longitude'])
 
     #column coding
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Rodzaj zabudowy', 'Zabudowa')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Okna', 'Okna')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Dach', 'Dach')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Stan wykończenia', 'Stan')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Rynek', 'Rynek')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Położenie', 'Położenie')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Liczba pięter', 'Liczba pięter')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Typ ogłoszeniodawcy', 'Ogłoszenie')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'voivodeship', 'Województwo')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Okolica', 'Okolica')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Pokrycie dachu', 'Pokrycie dachu')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Ogrodzenie', 'Ogrodzenie')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Materiał budynku', 'Materiał budynku')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Media', 'Media')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Dojazd', 'Dojazd')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Zabezpieczenia', 'Zabezpieczenia')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Informacje dodatkowe', 'Dodatkowo')
-    otodom_houses = encode_multilabel_column(otodom_houses, 'Ogrzewanie', 'Ogrzewanie')
+    multilabel_columns = {
+        'Rodzaj zabudowy': 'Zabudowa',
+        'Okna': 'Okna',
+        'Dach': 'Dach',
+        'Stan wykończenia': 'Stan',
+        'Rynek': 'Rynek',
+        'Położenie': 'Położenie',
+        'Liczba pięter': 'Liczba pięter',
+        'Typ ogłoszeniodawcy': 'Ogłoszenie',
+        'voivodeship': 'Województwo',
+        'Okolica': 'Okolica',
+        'Pokrycie dachu': 'Pokrycie dachu',
+        'Ogrodzenie': 'Ogrodzenie',
+        'Materiał budynku': 'Materiał budynku',
+        'Media': 'Media',
+        'Dojazd': 'Dojazd',
+        'Zabezpieczenia': 'Zabezpieczenia',
+        'Informacje dodatkowe': 'Dodatkowo',
+        'Ogrzewanie': 'Ogrzewanie'
+    }
+    otodom_houses, vocabulary = encode_multilabel_columns(otodom_houses, multilabel_columns)
+    save_vocabulary(vocabulary, 'results/multilabel_vocabulary.json')
 
     #location clustering 
-    otodom_houses = cluster_locations_dbscan(otodom_houses, eps=0.05, min_samples=2)
+    otodom_houses, location_model = cluster_locations(otodom_houses, return_model=True, **LOCATION_CLUSTERING)
 
     # drop unused/unimportant columns
     columns_to_drop=[
@@ -73,9 +96,8 @@ def main():
     otodom_houses = otodom_houses[(otodom_houses['Price'] >= lower_limit) & (otodom_houses['Price'] <= upper_limit)]
 
     # add new features
-    otodom_houses["Area_per_room"] = otodom_houses["Area"] / otodom_houses["Rooms count"]
-    otodom_houses["Building_density"] = otodom_houses["Area"] / otodom_houses["Land area"]
-    otodom_houses["Area_to_rooms_ratio"] = otodom_houses["Land area"] / otodom_houses["Rooms count"]
+    for feature, (numerator, denominator) in DERIVED_FEATURES.items():
+        otodom_houses[feature] = otodom_houses[numerator] / otodom_houses[denominator]
 
 
     dataframe_statistics(otodom_houses, exclude_columns=[])
@@ -83,6 +105,20 @@ def main():
     save_to_csv(otodom_houses, file_paths=[
         'results/otodom_houses_cleaned.csv'
     ])
+    save_to_parquet(otodom_houses, file_paths=[
+        'results/otodom_houses_cleaned.parquet'
+    ])
+
+    # used by training and the app to build model input from a raw listing
+    feature_transform = build_feature_transform(
+        otodom_houses, 'Price', multilabel_columns, vocabulary, DERIVED_FEATURES, location_model,
+        renamed_columns=column_mapping
+    )
+    save_feature_transform(feature_transform, location_model, results_dir='results')
+
+    # summaries for the dataset explorer page of the app
+    save_statistics(otodom_houses, raw_preview, raw_rows, list(feature_transform['multilabel_features']), 'Price',
+                    results_dir='results/stats')
 
 if __name__ == "__main__":
     main()
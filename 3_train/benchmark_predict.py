@@ -0,0 +1,80 @@
+import argparse
+import os
+import time
+import joblib
+import numpy as np
+from threadpoolctl import threadpool_limits
+from training.compiled_trees import COMPILERS, compile_model, compiled_path, model_source
+from training.data import find_cleaned_data, load_cleaned_data
+from training.pipeline import CLEANING_RESULTS_FOLDER
+from training.scheduler import THREAD_PARAMS
+
+
+def throughput(predict, X):
+    start = time.perf_counter()
+    predict(X)
+    return len(X) / (time.perf_counter() - start)
+
+
+# compiles the tree ensembles of a training (or of best_results), checks them against the
+# model's own predict on the cleaned data and compares throughput on rows repeated up to
+# --rows, both with --threads threads. With --save, a compiled model that matches and is
+# faster is saved next to the model, and valuate.py uses it instead of the model's predict.
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compiled tree predictors against native predict')
+    parser.add_argument('--training', default='results/t1', help='training folder with models and scaler.pkl')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--threads', type=int, default=1,
+                        help='threads of both predictors, 1 by default like the workers of valuate.py')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='max allowed difference of log price')
+    parser.add_argument('--save', action='store_true', help='save verified compiled models that are faster than native')
+    args = parser.parse_args()
+
+    df = load_cleaned_data(find_cleaned_data(CLEANING_RESULTS_FOLDER))
+    scaler = joblib.load(os.path.join(args.training, 'scaler.pkl'))
+    X = scaler.transform(df.drop(columns=['Price']).to_numpy())
+    X_bulk = np.resize(X, (args.rows, X.shape[1]))
+
+    print(f'{"model":<24}{"threads":>8}{"max diff":>12}{"native rows/s":>16}{"compiled rows/s":>18}{"speedup":>9}')
+    models_folder = os.path.join(args.training, 'models')
+    if not os.path.isdir(models_folder):
+        # best_results keeps its model next to scaler.pkl
+        models_folder = args.training
+    for file_name in sorted(os.listdir(models_folder)):
+        if not file_name.endswith('.pkl'):
+            continue
+        model_path = os.path.join(models_folder, file_name)
+        model = joblib.load(model_path)
+        if type(model).__name__ not in COMPILERS:
+            continue
+
+        # models keep the thread count they were trained with, threadpool_limits
+        # doesn't reach the thread pools of joblib, XGBoost or LightGBM
+        thread_param = THREAD_PARAMS.get(type(model).__name__)
+        if thread_param:
+            model.set_params(**{thread_param: args.threads})
+
+        compiled = compile_model(model)
+        max_diff = float(np.abs(compiled.predict(X) - model.predict(X)).max())
+        with threadpool_limits(args.threads):
+            native = throughput(model.predict, X_bulk)
+        fast = throughput(lambda rows: compiled.predict(rows, n_jobs=args.threads), X_bulk)
+
+        status = ''
+        if max_diff > args.tolerance:
+            status = '  MISMATCH'
+        elif fast <= native:
+            status = '  slower'
+        print(f'{file_name[:-4]:<24}{args.threads:>8}{max_diff:>12.2e}{native:>16,.0f}{fast:>18,.0f}{fast / native:>8.1f}x{status}')
+
+        path = compiled_path(model_path)
+        if args.save and not status:
+            compiled.source = model_source(model_path)
+            compiled.save(path)
+        elif args.save and os.path.exists(path):
+            # an earlier compiled model of this file is no longer worth using
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from training.data import file_hash
+
+COMPILED_TREES_VERSION = 2
+
+
+# tree ensemble flattened into node arrays shared by all trees, evaluated for many
+# rows at once with NumPy. Leaves have feature -1. Predicts the same raw value as
+# the model's predict (log price for the models of this project).
+class CompiledTrees:
+    def __init__(self, feature, threshold, left, right, value, default_left, roots, base_score=0.0,
+                 scale=1.0, strict=False, input_dtype='float64', max_depth=None, source=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_score = float(base_score)
+        # RandomForest averages its trees, boosting sums them
+        self.scale = float(scale)
+        # XGBoost sends x < threshold left, the other libraries x <= threshold
+        self.strict = bool(strict)
+        # sklearn forests and XGBoost compare float32 features
+        self.input_dtype = input_dtype
+        self.max_depth = max_depth if max_depth is not None else self._max_depth()
+        # hash of the model pickle it was compiled from, set when saved next to it
+        self.source = source
+
+        # traversal layout: leaves point to themselves with an infinite threshold, so every
+        # row can take max_depth steps without checking for leaves, and children[node, went_right]
+        # is the next node
+        is_leaf = self.feature < 0
+        nodes = np.arange(len(self.feature), dtype=np.int32)
+        self._feature = np.where(is_leaf, 0, self.feature).astype(np.intp)
+        self._threshold = np.where(is_leaf, np.inf, self.threshold)
+        self._children = np.column_stack([
+            np.where(is_leaf, nodes, self.left), np.where(is_leaf, nodes, self.right)
+        ]).ravel().astype(np.intp)
+
+    # number of splits on the longest path, the traversal takes that many steps
+    def _max_depth(self):
+        nodes = self.roots
+        depth = 0
+        while True:
+            nodes = nodes[self.feature[nodes] >= 0]
+            if not len(nodes):
+                return depth
+            nodes = np.concatenate([self.left[nodes], self.right[nodes]])
+            depth += 1
+
+    def _predict_chunk(self, X):
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        node = np.tile(self.roots.astype(np.intp), (n_rows, 1))
+        has_nan = np.isnan(X).any()
+
+        for _ in range(self.max_depth):
+            x = X_flat.take(row_offsets + self._feature.take(node))
+            threshold = self._threshold.take(node)
+            went_right = x >= threshold if self.strict else x > threshold
+            if has_nan:
+                missing = np.isnan(x)
+                went_right[missing] = ~self.default_left.take(node[missing])
+            node = self._children.take(node * 2 + went_right)
+
+        return self.value.take(node).sum(axis=1) * self.scale + self.base_score
+
+    # rows are evaluated in chunks of chunk_size x number of trees nodes, small enough to
+    # stay in cache, chunks run in n_jobs threads (NumPy releases the GIL in the indexing work)
+    def predict(self, X, chunk_size=None, n_jobs=1):
+        X = np.ascontiguousarray(np.asarray(X, dtype=self.input_dtype), dtype=np.float64)
+        chunk_size = chunk_size or max(256, 100_000 // len(self.roots))
+
+        chunks = [X[start:start + chunk_size] for start in range(0, len(X), chunk_size)]
+        if n_jobs == 1 or len(chunks) == 1:
+            predictions = [self._predict_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                predictions = list(executor.map(self._predict_chunk, chunks))
+        return np.concatenate(predictions) if predictions else np.zeros(0)
+
+    def save(self, path):
+        arrays = {key: getattr(self, key) for key in ["feature", "threshold", "left", "right", "value", "default_left", "roots"]}
+        settings = {
+            "version": COMPILED_TREES_VERSION, "base_score": self.base_score, "scale": self.scale,
+            "strict": self.strict, "input_dtype": self.input_dtype, "max_depth": self.max_depth,
+            "source": self.source
+        }
+        np.savez(path, settings=np.array(json.dumps(settings)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            settings = json.loads(str(data["settings"]))
+            if settings.pop("version") != COMPILED_TREES_VERSION:
+                raise ValueError(f"Unsupported compiled trees version in {path}")
+            arrays = {key: data[key] for key in data.files if key != "settings"}
+        return cls(**arrays, **settings)
+
+
+# concatenates per-tree node arrays, child indices are shifted to the global numbering
+def stack_trees(trees):
+    offsets = np.cumsum([0] + [len(tree["feature"]) for tree in trees[:-1]])
+    stacked = {key: np.concatenate([tree[key] for tree in trees]) for key in ["feature", "threshold", "value", "default_left"]}
+    for key in ["left", "right"]:
+        stacked[key] = np.concatenate([
+            np.where(tree["feature"] >= 0, tree[key] + offset, -1) for tree, offset in zip(trees, offsets)
+        ])
+    stacked["roots"] = offsets
+    return stacked
+
+
+def compile_random_forest(model):
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        missing_go_to_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+        trees.append({
+            "feature": np.where(is_leaf, -1, tree.feature),
+            "threshold": tree.threshold,
+            "left": tree.children_left,
+            "right": tree.children_right,
+            "value": tree.value[:, 0, 0],
+            "default_left": missing_go_to_left.astype(bool)
+        })
+    return CompiledTrees(**stack_trees(trees), scale=1 / len(trees), input_dtype='float32')
+
+
+def compile_hist_gradient_boosting(model):
+    trees = []
+    for predictors in model._predictors:
+        nodes = predictors[0].nodes
+        if nodes["is_categorical"].any():
+            raise ValueError("Categorical splits are not supported")
+        is_leaf = nodes["is_leaf"].astype(bool)
+        trees.append({
+            "feature": np.where(is_leaf, -1, nodes["feature_idx"]),
+            "threshold": nodes["num_threshold"],
+            "left": nodes["left"],
+            "right": nodes["right"],
+            "value": nodes["value"],
+            "default_left": nodes["missing_go_to_left"].astype(bool)
+        })
+    return CompiledTrees(**stack_trees(trees), base_score=np.ravel(model._baseline_prediction)[0])
+
+
+# LightGBM Booster or LGBMRegressor, read from the JSON model dump
+def compile_lightgbm(model):
+    booster = getattr(model, "booster_", model)
+    dump = booster.dump_model()
+    trees = []
+
+    for tree_info in dump["tree_info"]:
+        nodes = {"feature": [], "threshold": [], "left": [], "right": [], "value": [], "default_left": []}
+
+        def add_node(node):
+            index = len(nodes["feature"])
+            for key in nodes:
+                nodes[key].append(-1 if key in ("feature", "left", "right") else 0)
+            if "leaf_value" in node:
+                nodes["value"][index] = node["leaf_value"]
+                return index
+
+            if node["decision_type"] != "<=":
+                raise ValueError("Categorical splits are not supported")
+            if node["missing_type"] == "Zero":
+                raise ValueError("Zero as missing value is not supported")
+            nodes["feature"][index] = node["split_feature"]
+            nodes["threshold"][index] = node["threshold"]
+            # without missing value handling LightGBM replaces NaN by 0 before the comparison
+            nodes["default_left"][index] = node["default_left"] if node["missing_type"] == "NaN" else 0.0 <= node["threshold"]
+            nodes["left"][index] = add_node(node["left_child"])
+            nodes["right"][index] = add_node(node["right_child"])
+            return index
+
+        add_node(tree_info["tree_structure"])
+        trees.append({key: np.array(values) for key, values in nodes.items()})
+
+    return CompiledTrees(**stack_trees(trees))
+
+
+# XGBoost Booster or XGBRegressor, read from the JSON tree dump
+def compile_xgboost(model):
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    feature_index = {name: i for i, name in enumerate(booster.feature_names or [])}
+    config = json.loads(booster.save_config())
+    base_score = float(config["learner"]["learner_model_param"]["base_score"].strip("[]"))
+    if config["learner"]["objective"]["name"] != "reg:squarederror":
+        raise ValueError("Only the reg:squarederror objective is supported")
+
+    trees = []
+    for tree_dump in booster.get_dump(dump_format="json"):
+        by_id = {}
+        stack = [json.loads(tree_dump)]
+        while stack:
+            node = stack.pop()
+            by_id[node["nodeid"]] = node
+            stack.extend(node.get("children", []))
+
+        # node ids are dense, so they are used directly as indices
+        n_nodes = max(by_id) + 1
+        tree = {
+            "feature": np.full(n_nodes, -1), "threshold": np.zeros(n_nodes), "left": np.full(n_nodes, -1),
+            "right": np.full(n_nodes, -1), "value": np.zeros(n_nodes), "default_left": np.zeros(n_nodes, dtype=bool)
+        }
+        for node_id, node in by_id.items():
+            if "leaf" in node:
+                tree["value"][node_id] = node["leaf"]
+                continue
+            split = node["split"]
+            tree["feature"][node_id] = feature_index[split] if split in feature_index else int(split[1:])
+            tree["threshold"][node_id] = np.float32(node["split_condition"])
+            tree["left"][node_id] = node["yes"]
+            tree["right"][node_id] = node["no"]
+            tree["default_left"][node_id] = node["missing"] == node["yes"]
+        trees.append(tree)
+
+    return CompiledTrees(**stack_trees(trees), base_score=base_score, strict=True, input_dtype='float32')
+
+
+COMPILERS = {
+    "RandomForestRegressor": compile_random_forest,
+    "HistGradientBoostingRegressor": compile_hist_gradient_boosting,
+    "LGBMRegressor": compile_lightgbm,
+    "XGBRegressor": compile_xgboost,
+}
+
+
+# fitted sklearn-API model, or a lightgbm/xgboost Booster loaded from a native file
+def compile_model(model):
+    model_class = type(model).__name__
+    if model_class == "Booster":
+        # lightgbm.Booster and xgboost.Booster share the class name
+        compiler = compile_lightgbm if type(model).__module__.startswith("lightgbm") else compile_xgboost
+    else:
+        compiler = COMPILERS.get(model_class)
+    if compiler is None:
+        raise ValueError(f"{model_class} can't be compiled, supported: {list(COMPILERS)}")
+    return compiler(model)
+
+
+def compiled_path(model_path):
+    return os.path.splitext(model_path)[0] + ".trees.npz"
+
+
+# the pickle and the native file of a model are saved from the same fit, the pickle identifies it
+def model_source(model_path):
+    return file_hash(os.path.splitext(model_path)[0] + ".pkl")
+
+
+# compiled predictor saved next to a model (pickle or native file) by benchmark_predict.py --save,
+# which saves it only when it matches the model's predict and is faster. None when there is
+# none, or it is from an older version of this module or of the model.
+def load_compiled(model_path):
+    path = compiled_path(model_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        compiled = CompiledTrees.load(path)
+    except ValueError:
+        return None
+    return compiled if compiled.source == model_source(model_path) else None
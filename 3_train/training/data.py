@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import shutil
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+# bump when load/split/scale change, so old cached matrices are not reused
+DATA_CACHE_VERSION = 1
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_values(*values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# prefer the parquet file from the cleaning stage, fall back to csv
+def find_cleaned_data(cleaning_results_folder):
+    parquet_path = os.path.join(cleaning_results_folder, 'otodom_houses_cleaned.parquet')
+    if os.path.exists(parquet_path):
+        return parquet_path
+    return os.path.join(cleaning_results_folder, 'otodom_houses_cleaned.csv')
+
+
+def load_cleaned_data(data_path):
+    if data_path.endswith('.parquet'):
+        return pd.read_parquet(data_path)
+    return pd.read_csv(data_path, delimiter=';')
+
+
+def split_data(df, target='Price', test_size=0.2, random_state=42):
+    X = df.drop(columns=[target])
+    y = df[target]
+    return train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+
+def scale_data(X_train, X_test):
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    return scaler, X_train_scaled, X_test_scaled
+
+
+# loaded, split and scaled matrices, cached under a hash of the data file and split settings
+def prepare_data(data_path, cache_folder, target='Price', test_size=0.2, random_state=42):
+    data_key = hash_values(file_hash(data_path), target, test_size, random_state, DATA_CACHE_VERSION)
+    data_folder = os.path.join(cache_folder, 'data', data_key[:16])
+
+    if os.path.isdir(data_folder):
+        print(f"Using cached data from {data_folder}")
+    else:
+        df = load_cleaned_data(data_path)
+        X_train, X_test, y_train, y_test = split_data(df, target, test_size, random_state)
+        scaler, X_train_scaled, X_test_scaled = scale_data(X_train, X_test)
+
+        # written to a temporary folder and renamed, a crash never leaves a partial cache
+        tmp_folder = data_folder + '.tmp'
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        os.makedirs(tmp_folder)
+        np.savez(
+            os.path.join(tmp_folder, 'matrices.npz'),
+            X_train=X_train_scaled, X_test=X_test_scaled,
+            y_train=y_train.to_numpy(), y_test=y_test.to_numpy(),
+            train_index=X_train.index.to_numpy(), test_index=X_test.index.to_numpy()
+        )
+        joblib.dump(scaler, os.path.join(tmp_folder, 'scaler.pkl'))
+        with open(os.path.join(tmp_folder, 'columns.json'), 'w') as f:
+            json.dump(list(X_train.columns), f)
+        os.replace(tmp_folder, data_folder)
+        print(f"Data cached in {data_folder}")
+
+    with np.load(os.path.join(data_folder, 'matrices.npz')) as matrices:
+        data = {key: matrices[key] for key in matrices.files}
+    with open(os.path.join(data_folder, 'columns.json'), 'r') as f:
+        data['columns'] = json.load(f)
+    data['scaler_path'] = os.path.join(data_folder, 'scaler.pkl')
+    data['key'] = data_key
+    return data
@@ -0,0 +1,98 @@
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+# held-out rows of an experiment: row of the cleaned data, actual price and the
+# predicted price of every model (column named by model file name)
+PREDICTIONS_FILE = "test_predictions.parquet"
+
+# boosting libraries saved in their own compact format, class: (format, extension).
+# Every other model is read from its uncompressed joblib pickle.
+NATIVE_FORMATS = {
+    "LGBMRegressor": ("lightgbm", "txt"),
+    "XGBRegressor": ("xgboost", "ubj"),
+    "CatBoostRegressor": ("catboost", "cbm"),
+}
+
+
+def save_native_model(model, model_class, path_without_extension):
+    if model_class not in NATIVE_FORMATS:
+        return None
+
+    path = f"{path_without_extension}.{NATIVE_FORMATS[model_class][1]}"
+    if model_class == "LGBMRegressor":
+        model.booster_.save_model(path)
+    else:
+        model.save_model(path)
+    return path
+
+
+# file and format the app loads for a model saved as file_name.pkl
+def model_file_format(model_class, file_name):
+    if model_class in NATIVE_FORMATS:
+        model_format, extension = NATIVE_FORMATS[model_class]
+        return f"{file_name}.{extension}", model_format
+    return f"{file_name}.pkl", "joblib"
+
+
+# manifest.json of an experiment: feature order, scaler parameters, and the file,
+# format and metrics of every model, so the app needs no pickles to build input
+def update_manifest(experiment_folder, scaler_path, feature_columns, models):
+    manifest_path = os.path.join(experiment_folder, MANIFEST_FILE)
+    manifest = {"models": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    scaler = joblib.load(scaler_path)
+    manifest.update({
+        "version": MANIFEST_VERSION,
+        "feature_columns": list(feature_columns),
+        "target": "log1p",
+        "scaler": {"mean": scaler.mean_.tolist(), "scale": scaler.scale_.tolist()}
+    })
+    manifest["models"].update(models)
+
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+# residuals (predicted - actual price) of a model on the held-out rows, shown by the app
+def residual_summary(y_test, y_pred):
+    residuals = np.asarray(y_pred, dtype=np.float64) - np.asarray(y_test, dtype=np.float64)
+    percentage_errors = np.abs(residuals) / np.asarray(y_test, dtype=np.float64) * 100
+    quantiles = np.percentile(residuals, [5, 25, 50, 75, 95])
+    return {
+        "mean": float(residuals.mean()),
+        "std": float(residuals.std()),
+        "quantiles": dict(zip(["5%", "25%", "50%", "75%", "95%"], quantiles.tolist())),
+        "median_absolute_error": float(np.median(np.abs(residuals))),
+        "median_percentage_error": float(np.median(percentage_errors))
+    }
+
+
+# adds the test predictions of models to the experiment's predictions file,
+# models: {model file name: predicted prices in test_index order}
+def update_predictions(experiment_folder, test_index, y_test, models):
+    predictions_path = os.path.join(experiment_folder, PREDICTIONS_FILE)
+    predictions = None
+    if os.path.exists(predictions_path):
+        predictions = pd.read_parquet(predictions_path)
+        # an experiment always uses the same split, a file from other data is replaced
+        if not np.array_equal(predictions["row"].to_numpy(), test_index):
+            predictions = None
+    if predictions is None:
+        predictions = pd.DataFrame({"row": np.asarray(test_index, dtype=np.int64), "Actual price": np.asarray(y_test, dtype=np.float64)})
+
+    for file_name, y_pred in models.items():
+        predictions[file_name] = np.asarray(y_pred, dtype=np.float64)
+
+    tmp_path = predictions_path + '.tmp'
+    predictions.to_parquet(tmp_path, index=False, engine='pyarrow')
+    os.replace(tmp_path, predictions_path)
@@ -0,0 +1,74 @@
+import json
+import os
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import r2_score
+
+# rows of the test set used for permutation importance
+PERMUTATION_MAX_ROWS = 2000
+PERMUTATION_REPEATS = 3
+
+
+# one-hot columns of a multilabel feature are one group, every other column is its own group.
+# Returns {group name: [column indices]}
+def feature_groups(columns, transform_path=None):
+    prefix_of = {}
+    if transform_path and os.path.exists(transform_path):
+        with open(transform_path, 'r', encoding='utf-8') as f:
+            transform = json.load(f)
+        for prefix, labels in transform['multilabel_features'].items():
+            prefix_of.update({f"{prefix} {label}": prefix for label in labels})
+
+    groups = {}
+    for i, column in enumerate(columns):
+        groups.setdefault(prefix_of.get(column, column), []).append(i)
+    return groups
+
+
+# impurity based importances of tree ensembles or absolute coefficients of linear
+# models, features are standardized so coefficients are comparable. None if the model has neither.
+def native_importances(model):
+    if hasattr(model, "feature_importances_"):
+        return np.asarray(model.feature_importances_, dtype=np.float64)
+    try:
+        coef = model.coef_
+    except AttributeError:
+        # e.g. SVR with a non-linear kernel
+        return None
+    return np.abs(np.asarray(coef, dtype=np.float64)).ravel()
+
+
+def permuted_score(model, X, y_log, columns, seed):
+    X_permuted = X.copy()
+    X_permuted[:, columns] = X[np.random.default_rng(seed).permutation(len(X))][:, columns]
+    return r2_score(y_log, model.predict(X_permuted))
+
+
+# drop of R² (in the log price space the models predict in) when all columns of a
+# group are shuffled together, on a subsample of the test set
+def grouped_permutation_importances(model, X_test, y_test_log, groups, n_jobs=1,
+                                    n_repeats=PERMUTATION_REPEATS, max_rows=PERMUTATION_MAX_ROWS, seed=42):
+    rng = np.random.default_rng(seed)
+    if len(X_test) > max_rows:
+        rows = rng.choice(len(X_test), max_rows, replace=False)
+        X_test, y_test_log = X_test[rows], y_test_log[rows]
+    X_test = np.asarray(X_test)
+
+    baseline = r2_score(y_test_log, model.predict(X_test))
+    group_columns = list(groups.values())
+    scores = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(permuted_score)(model, X_test, y_test_log, columns, seed + repeat)
+        for columns in group_columns for repeat in range(n_repeats)
+    )
+    scores = np.array(scores).reshape(len(group_columns), n_repeats)
+    return baseline - scores.mean(axis=1)
+
+
+# {"features": [...], "importances": [...], "method": ...} as saved next to every model
+def compute_importances(model, X_test, y_test_log, feature_names, groups, n_jobs=1):
+    importances = native_importances(model)
+    if importances is not None and len(importances) == len(feature_names):
+        return {"features": list(feature_names), "importances": importances.tolist(), "method": "native"}
+
+    importances = grouped_permutation_importances(model, X_test, y_test_log, groups, n_jobs)
+    return {"features": list(groups), "importances": importances.tolist(), "method": "grouped_permutation"}
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.linear_model import LinearRegression, Lasso, Ridge, ElasticNet
+from sklearn.svm import SVR
+from sklearn.neighbors import KNeighborsRegressor
+from xgboost import XGBRegressor
+from lightgbm import LGBMRegressor
+from catboost import CatBoostRegressor
+from sklearn.neural_network import MLPRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from training.data import hash_values
+from training.export import NATIVE_FORMATS, save_native_model
+from training.importance import compute_importances
+
+# model classes that can be used in model_params.json
+MODEL_CLASSES = {
+    model_class.__name__: model_class
+    for model_class in [
+        LinearRegression, Lasso, Ridge, ElasticNet, RandomForestRegressor, GradientBoostingRegressor,
+        HistGradientBoostingRegressor, XGBRegressor, LGBMRegressor, CatBoostRegressor, SVR,
+        KNeighborsRegressor, MLPRegressor
+    ]
+}
+
+CHECKPOINT_FILES = ["model.pkl", "importances.json", "metrics.json", "y_pred.npy"]
+# bump when what is saved in a checkpoint changes, so old checkpoints are refitted
+CHECKPOINT_VERSION = 3
+
+
+def model_file_name(name):
+    return name.replace(' ', '_')
+
+
+# a model is refitted only when its data, class or params change
+def checkpoint_key(data_key, model_class, params):
+    return hash_values(data_key, model_class, params, CHECKPOINT_VERSION)
+
+
+def checkpoint_folder(cache_folder, name, key):
+    return os.path.join(cache_folder, 'models', f"{model_file_name(name)}_{key[:16]}")
+
+
+def load_checkpoint(folder):
+    if not all(os.path.exists(os.path.join(folder, file_name)) for file_name in CHECKPOINT_FILES):
+        return None
+    with open(os.path.join(folder, 'metrics.json'), 'r') as f:
+        result = json.load(f)
+    result["y_pred"] = np.load(os.path.join(folder, 'y_pred.npy'))
+    return result
+
+
+def evaluate(y_test, y_pred):
+    return {
+        "MAE": mean_absolute_error(y_test, y_pred),
+        "RMSE": np.sqrt(mean_squared_error(y_test, y_pred)),
+        "R2": r2_score(y_test, y_pred)
+    }
+
+
+# fits one model in a worker process of run_parallel and writes its checkpoint,
+# arrays are views into shared memory
+def fit_model(task, arrays):
+    model = MODEL_CLASSES[task["model_class"]](**task["params"])
+    model.fit(arrays["X_train"], arrays["y_train"])
+    y_pred = np.expm1(model.predict(arrays["X_test"]))
+
+    metrics = {key: float(value) for key, value in evaluate(arrays["y_test"], y_pred).items()}
+    importances = compute_importances(
+        model, arrays["X_test"], np.log1p(arrays["y_test"]), task["feature_names"], task["feature_groups"],
+        task["threads"]
+    )
+
+    # written to a temporary folder and renamed, a crash never leaves a partial checkpoint
+    folder = task["checkpoint_folder"]
+    tmp_folder = folder + '.tmp'
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+    joblib.dump(model, os.path.join(tmp_folder, 'model.pkl'))
+    save_native_model(model, task["model_class"], os.path.join(tmp_folder, 'native'))
+    np.save(os.path.join(tmp_folder, 'y_pred.npy'), y_pred)
+    with open(os.path.join(tmp_folder, 'importances.json'), 'w') as f:
+        json.dump(importances, f, indent=4)
+    with open(os.path.join(tmp_folder, 'metrics.json'), 'w') as f:
+        json.dump(metrics, f, indent=4)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(tmp_folder, folder)
+
+    return {**metrics, "y_pred": y_pred}
+
+
+# copy a checkpoint into the experiment with the file names the app reads
+def export_checkpoint(folder, name, models_folder, model_class):
+    file_name = model_file_name(name)
+    shutil.copy(os.path.join(folder, 'model.pkl'), os.path.join(models_folder, f"{file_name}.pkl"))
+    if model_class in NATIVE_FORMATS:
+        extension = NATIVE_FORMATS[model_class][1]
+        shutil.copy(os.path.join(folder, f"native.{extension}"), os.path.join(models_folder, f"{file_name}.{extension}"))
+    shutil.copy(
+        os.path.join(folder, 'importances.json'),
+        os.path.join(models_folder, f"{file_name}_future_importances.json")
+    )
@@ -0,0 +1,308 @@
+import json
+import os
+import shutil
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from training.data import find_cleaned_data, prepare_data
+from training.export import MANIFEST_FILE, NATIVE_FORMATS, model_file_format, residual_summary, update_manifest, \
+    update_predictions
+from training.importance import feature_groups
+from training.models import MODEL_CLASSES, checkpoint_folder, checkpoint_key, export_checkpoint, fit_model, \
+    load_checkpoint, model_file_name
+from training.scheduler import run_parallel
+
+TRAIN_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLEANING_RESULTS_FOLDER = os.path.normpath(os.path.join(TRAIN_FOLDER, '..', '2_clean_data', 'results'))
+
+# feature transform from the cleaning stage, used by the app to build model input
+FEATURE_TRANSFORM_FILES = ["feature_transform.json", "location_clusters.npz"]
+
+
+# creates a new training folder with unique name, ex. t1, t2 ...
+def create_experiment_folder(base_folder="results", experiment_id=None):
+    os.makedirs(base_folder, exist_ok=True)
+    if experiment_id is None:
+        experiment_id = f"t{len([d for d in os.listdir(base_folder) if os.path.isdir(os.path.join(base_folder, d))]) + 1}"
+    experiment_folder = os.path.join(base_folder, experiment_id)
+    os.makedirs(experiment_folder, exist_ok=True)
+    return experiment_folder
+
+
+def save_plot(plt, path):
+    plt.savefig(path, format='png', dpi=300)
+    plt.close()
+
+
+# model_params.json entries, only the selected models if given
+def load_model_params(params_path, selected_models=None):
+    with open(params_path, 'r') as file:
+        model_params = json.load(file)
+
+    if selected_models:
+        unknown = [name for name in selected_models if name not in model_params]
+        if unknown:
+            raise ValueError(f"Models not found in {params_path}: {unknown}")
+        model_params = {name: model_params[name] for name in selected_models}
+
+    for name, entry in model_params.items():
+        if entry['model'] not in MODEL_CLASSES:
+            raise ValueError(f"Unknown model class '{entry['model']}' for {name}")
+    return model_params
+
+
+def copy_feature_transform(source_folder, destination_folder):
+    for file_name in FEATURE_TRANSFORM_FILES:
+        source = os.path.join(source_folder, file_name)
+        if os.path.exists(source):
+            shutil.copy(source, os.path.join(destination_folder, file_name))
+
+
+def check_feature_transform(columns, cleaning_results_folder):
+    transform_path = os.path.join(cleaning_results_folder, "feature_transform.json")
+    if not os.path.exists(transform_path):
+        print(f"Feature transform not found in {cleaning_results_folder}, the app will use the one from the cleaning stage")
+        return False
+
+    with open(transform_path, 'r', encoding='utf-8') as f:
+        feature_columns = json.load(f)["feature_columns"]
+    if feature_columns != list(columns):
+        raise ValueError("Columns of the cleaned data don't match feature_transform.json, run the cleaning stage again")
+    return True
+
+
+# experiment.json remembers the data and checkpoint of every model in the experiment
+def load_experiment_state(experiment_folder, data_key):
+    state_path = os.path.join(experiment_folder, "experiment.json")
+    if not os.path.exists(state_path):
+        return {"data_key": data_key, "models": {}}
+
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+    if state["data_key"] != data_key:
+        raise ValueError(f"{experiment_folder} was trained on different data, start a new experiment")
+    return state
+
+
+def save_experiment_state(experiment_folder, state):
+    with open(os.path.join(experiment_folder, "experiment.json"), 'w') as f:
+        json.dump(state, f, indent=4)
+
+
+# fits the models without a checkpoint for the current data and params, concurrently,
+# models with one are copied from the cache. Returns {name: result}.
+def train_models(model_params, data, models_folder, cache_folder, force=False, n_cores=None, on_result=None,
+                 groups=None, deadline=None):
+    trained = {}
+    tasks = []
+    groups = groups or feature_groups(data['columns'])
+
+    for name, entry in model_params.items():
+        key = checkpoint_key(data['key'], entry['model'], entry['params'])
+        folder = checkpoint_folder(cache_folder, name, key)
+        checkpoint = None if force else load_checkpoint(folder)
+
+        if checkpoint is not None:
+            print(f"{name} - unchanged, using checkpoint {folder}")
+            export_checkpoint(folder, name, models_folder, entry['model'])
+            trained[name] = {**checkpoint, "key": key, "model_class": entry['model']}
+            if on_result:
+                on_result(name, trained[name])
+            continue
+
+        tasks.append({
+            "name": name,
+            "model_class": entry['model'],
+            "params": entry['params'],
+            "key": key,
+            "checkpoint_folder": folder,
+            "feature_names": data['columns'],
+            "feature_groups": groups
+        })
+
+    def task_finished(task, result):
+        export_checkpoint(task["checkpoint_folder"], task["name"], models_folder, task["model_class"])
+        print(f"{task['name']} - MAE: {result['MAE']:.2f} | RMSE: {result['RMSE']:.2f} | R²: {result['R2']:.3f} "
+              f"({result['Fit time']:.0f} s, {task['threads']} threads)")
+        trained[task["name"]] = {**result, "key": task["key"], "model_class": task["model_class"]}
+        if on_result:
+            on_result(task["name"], trained[task["name"]])
+
+    if tasks:
+        arrays = {
+            "X_train": data['X_train'],
+            "y_train": np.log1p(data['y_train']),
+            "X_test": data['X_test'],
+            "y_test": data['y_test']
+        }
+        os.makedirs(os.path.join(cache_folder, 'models'), exist_ok=True)
+        run_parallel(tasks, arrays, fit_model, task_finished, n_cores=n_cores, deadline=deadline)
+
+    return trained
+
+
+def save_plots(results, y_test, best_model_name, best_y_pred, experiment_folder, best_results_folder):
+    if best_y_pred is not None:
+        plt.figure(figsize=(10, 6))
+        sns.scatterplot(x=y_test, y=best_y_pred, alpha=0.5)
+        plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--')
+        plt.xlabel("Actual Price")
+        plt.ylabel("Predicted Price")
+        plt.title(f"Actual vs Predicted Price ({best_model_name})")
+        save_plot(plt, os.path.join(experiment_folder, "actual_vs_predicted.png"))
+        shutil.copy(
+            os.path.join(experiment_folder, "actual_vs_predicted.png"),
+            os.path.join(best_results_folder, "actual_vs_predicted.png")
+        )
+
+    for metric in ["RMSE", "MAE"]:
+        plt.figure(figsize=(10, 15))
+        sns.barplot(x="Model", y=metric, data=pd.DataFrame(results), palette="coolwarm")
+        plt.yscale("log")
+        plt.xticks(rotation=45, ha="right")
+        plt.title(f"Model Comparison - {metric}")
+        save_plot(plt, os.path.join(experiment_folder, f"{metric.lower()}_comparison.png"))
+        shutil.copy(
+            os.path.join(experiment_folder, f"{metric.lower()}_comparison.png"),
+            os.path.join(best_results_folder, f"{metric.lower()}_comparison.png")
+        )
+
+
+# model files of an earlier best model, any pickle but the scaler, any native model
+# file and compiled trees
+def remove_saved_models(folder):
+    native_extensions = tuple(f".{extension}" for _, extension in NATIVE_FORMATS.values()) + (".trees.npz",)
+    for file in os.listdir(folder):
+        if (file.endswith(".pkl") and file != "scaler.pkl") or file.endswith(native_extensions) or file == MANIFEST_FILE:
+            os.remove(os.path.join(folder, file))
+
+
+# manifest of the experiment with the best model only, its files are next to the manifest
+def save_best_manifest(best_model_name, experiment_folder, best_results_folder):
+    manifest_path = os.path.join(experiment_folder, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    entry = manifest["models"].get(model_file_name(best_model_name))
+    if entry is None:
+        return
+    if entry["file"] != f"{model_file_name(best_model_name)}.pkl":
+        shutil.copy(os.path.join(experiment_folder, "models", entry["file"]), os.path.join(best_results_folder, entry["file"]))
+    manifest["models"] = {model_file_name(best_model_name): entry}
+    with open(os.path.join(best_results_folder, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+
+
+def save_best_results(results, best_model_name, experiment_folder, best_results_folder, has_feature_transform):
+    # the folder holds one model, a different winner replaces the previous one
+    remove_saved_models(best_results_folder)
+    best_model_file = f"{model_file_name(best_model_name)}.pkl"
+    best_model_path = os.path.join(best_results_folder, best_model_file)
+    shutil.copy(os.path.join(experiment_folder, "models", best_model_file), best_model_path)
+    compiled_trees = os.path.join(experiment_folder, "models", f"{model_file_name(best_model_name)}.trees.npz")
+    if os.path.exists(compiled_trees):
+        shutil.copy(compiled_trees, best_results_folder)
+    save_best_manifest(best_model_name, experiment_folder, best_results_folder)
+    print(f"Best model {best_model_name} saved to {best_model_path}")
+
+    scaler_path = os.path.join(best_results_folder, "scaler.pkl")
+    shutil.copy(os.path.join(experiment_folder, "scaler.pkl"), scaler_path)
+    print(f"Scaler saved to {scaler_path}")
+    if has_feature_transform:
+        copy_feature_transform(experiment_folder, best_results_folder)
+
+    with open(os.path.join(best_results_folder, "results.json"), 'w') as f:
+        json.dump(results, f, indent=4)
+
+
+# full training run: prepare data, fit changed models, save results, plots and best model.
+# Rerunning an experiment only fits models whose data or params changed. Fits still
+# running at the deadline (a time.monotonic() value) are stopped.
+def run(models=None, data_path=None, experiment_id=None, params_path=None, results_folder=None,
+        best_results_folder=None, cache_folder=None, cleaning_results_folder=CLEANING_RESULTS_FOLDER,
+        force=False, n_cores=None, deadline=None):
+    params_path = params_path or os.path.join(TRAIN_FOLDER, "model_params.json")
+    results_folder = results_folder or os.path.join(TRAIN_FOLDER, "results")
+    best_results_folder = best_results_folder or os.path.join(TRAIN_FOLDER, "best_results")
+    cache_folder = cache_folder or os.path.join(TRAIN_FOLDER, "cache")
+    data_path = data_path or find_cleaned_data(cleaning_results_folder)
+
+    model_params = load_model_params(params_path, models)
+    data = prepare_data(data_path, cache_folder)
+
+    experiment_folder = create_experiment_folder(results_folder, experiment_id)
+    state = load_experiment_state(experiment_folder, data['key'])
+    state["data_path"] = os.path.abspath(data_path)
+
+    # save scaler to current experiment folder
+    shutil.copy(data['scaler_path'], os.path.join(experiment_folder, "scaler.pkl"))
+    print(f"Scaler saved to {os.path.join(experiment_folder, 'scaler.pkl')}")
+
+    # the feature transform only describes the data written by the cleaning stage
+    from_cleaning_stage = os.path.dirname(os.path.abspath(data_path)) == os.path.abspath(cleaning_results_folder)
+    has_feature_transform = from_cleaning_stage and check_feature_transform(data['columns'], cleaning_results_folder)
+    if has_feature_transform:
+        copy_feature_transform(cleaning_results_folder, experiment_folder)
+        print(f"Feature transform saved to {experiment_folder}")
+
+    models_folder = os.path.join(experiment_folder, "models")
+    os.makedirs(models_folder, exist_ok=True)
+
+    # results of models trained earlier in this experiment are kept
+    results_path = os.path.join(experiment_folder, "results.json")
+    results = {}
+    if os.path.exists(results_path):
+        with open(results_path, 'r') as f:
+            results = {result["Model"]: result for result in json.load(f) if result["Model"] in state["models"]}
+
+    def on_result(name, result):
+        results[name] = {"Model": name, "MAE": result["MAE"], "RMSE": result["RMSE"], "R2": result["R2"]}
+        state["models"][name] = result["key"]
+        # keyed by file name like the model list of the app
+        model_file, model_format = model_file_format(result["model_class"], model_file_name(name))
+        update_manifest(experiment_folder, data['scaler_path'], data['columns'], {
+            model_file_name(name): {"name": name, "model_class": result["model_class"], "file": model_file,
+                                    "format": model_format, "metrics": results[name],
+                                    "residuals": residual_summary(data['y_test'], result["y_pred"])}
+        })
+        # the app plots these instead of predicting the test set again
+        update_predictions(experiment_folder, data['test_index'], data['y_test'], {model_file_name(name): result["y_pred"]})
+        # results so far, a crash later in the run keeps the finished models
+        with open(results_path, 'w') as f:
+            json.dump(list(results.values()), f, indent=4)
+        save_experiment_state(experiment_folder, state)
+
+    # one-hot columns of one multilabel feature are permuted together in permutation importance
+    transform_path = os.path.join(cleaning_results_folder, "feature_transform.json") if has_feature_transform else None
+    groups = feature_groups(data['columns'], transform_path)
+
+    trained = train_models(model_params, data, models_folder, cache_folder, force, n_cores, on_result, groups, deadline)
+    if not results:
+        raise RuntimeError("No model was trained successfully")
+
+    # model_params.json order, then models no longer in it
+    order = list(load_model_params(params_path))
+    order += [name for name in results if name not in order]
+    results = sorted(results.values(), key=lambda result: order.index(result["Model"]))
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    best_model_name = min(results, key=lambda x: x["RMSE"])['Model']
+    if best_model_name in trained:
+        best_y_pred = trained[best_model_name]["y_pred"]
+    else:
+        # best model kept from an earlier run, its predictions are in the checkpoint unless the cache was cleared
+        best_checkpoint = load_checkpoint(
+            checkpoint_folder(cache_folder, best_model_name, state["models"][best_model_name])
+        )
+        best_y_pred = best_checkpoint["y_pred"] if best_checkpoint else None
+
+    os.makedirs(best_results_folder, exist_ok=True)
+    save_plots(results, data['y_test'], best_model_name, best_y_pred, experiment_folder, best_results_folder)
+    save_best_results(results, best_model_name, experiment_folder, best_results_folder, has_feature_transform)
+
+    print(f"\nBest model: {best_model_name}")
+    return experiment_folder, results
@@ -0,0 +1,153 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+# parameter each library uses for its own thread count
+THREAD_PARAMS = {
+    "RandomForestRegressor": "n_jobs",
+    "KNeighborsRegressor": "n_jobs",
+    "XGBRegressor": "n_jobs",
+    "LGBMRegressor": "n_jobs",
+    "CatBoostRegressor": "thread_count",
+}
+
+# models parallelized internally through OpenMP/BLAS, limited with threadpoolctl
+THREADPOOL_MODELS = ["HistGradientBoostingRegressor", "MLPRegressor"]
+
+# rough relative fit time, the most expensive models are started first and get more threads
+MODEL_COSTS = {
+    "LinearRegression": 0.1,
+    "Lasso": 0.2,
+    "Ridge": 0.1,
+    "ElasticNet": 0.2,
+    "KNeighborsRegressor": 1,
+    "HistGradientBoostingRegressor": 3,
+    "LGBMRegressor": 3,
+    "MLPRegressor": 4,
+    "XGBRegressor": 6,
+    "CatBoostRegressor": 6,
+    "RandomForestRegressor": 8,
+    "SVR": 8,
+    "GradientBoostingRegressor": 10,
+}
+
+
+def is_parallel(model_class):
+    return model_class in THREAD_PARAMS or model_class in THREADPOOL_MODELS
+
+
+# split n_cores between models running at the same time and each model's own threads.
+# Expensive single-threaded models keep one core each, cheap ones finish within
+# seconds and reserve nothing. The rest is shared by the parallel models in
+# proportion to their cost. Returns {name: threads}.
+def plan_threads(model_classes, n_cores):
+    parallel = {name: MODEL_COSTS.get(cls, 1) for name, cls in model_classes.items() if is_parallel(cls)}
+    n_single = sum(
+        1 for cls in model_classes.values() if not is_parallel(cls) and MODEL_COSTS.get(cls, 1) >= 1
+    )
+    free_cores = max(n_cores - n_single, 1)
+    total_cost = sum(parallel.values())
+
+    threads = {name: 1 for name in model_classes}
+    for name, cost in parallel.items():
+        threads[name] = max(1, round(free_cores * cost / total_cost))
+    return threads
+
+
+# numpy arrays copied once into shared memory, so worker processes don't each
+# receive a pickled copy of the training data
+class SharedArrays:
+    def __init__(self, arrays):
+        self.blocks = []
+        self.specs = {}
+
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self.blocks.append(block)
+            self.specs[key] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_arrays(specs):
+    blocks = []
+    arrays = {}
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        blocks.append(block)
+    return arrays, blocks
+
+
+def run_task(task, specs, fit_function):
+    arrays, blocks = attach_arrays(specs)
+    try:
+        start = time.perf_counter()
+        # BLAS/OpenMP pools follow the planned thread count, so concurrent fits don't oversubscribe
+        with threadpool_limits(limits=task["threads"]):
+            result = fit_function(task, arrays)
+        result["Fit time"] = time.perf_counter() - start
+        return result
+    finally:
+        # views into shared memory must be gone before the blocks are closed
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+# tasks: list of dicts with at least "name", "model_class" and "params".
+# fit_function(task, arrays) runs in a worker process and returns a result dict.
+# on_result(task, result) is called in this process as soon as a model finishes.
+# At the deadline (a time.monotonic() value) unfinished tasks are stopped.
+def run_parallel(tasks, arrays, fit_function, on_result, n_cores=None, max_workers=None, deadline=None):
+    n_cores = n_cores or os.cpu_count() or 1
+    threads = plan_threads({task["name"]: task["model_class"] for task in tasks}, n_cores)
+
+    for task in tasks:
+        task["threads"] = threads[task["name"]]
+        thread_param = THREAD_PARAMS.get(task["model_class"])
+        if thread_param:
+            task["params"] = {**task["params"], thread_param: task["threads"]}
+
+    # longest first, so the slowest model isn't started last
+    tasks = sorted(tasks, key=lambda task: MODEL_COSTS.get(task["model_class"], 1), reverse=True)
+    max_workers = max_workers or min(len(tasks), n_cores)
+
+    results = {}
+    with SharedArrays(arrays) as shared, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_task, task, shared.specs, fit_function): task for task in tasks}
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                task = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"{task['name']} failed: {e!r}")
+                    continue
+                results[task["name"]] = result
+                on_result(task, result)
+        except TimeoutError:
+            # finished and failed tasks were reported above
+            print(f"Deadline reached, stopped: {[futures[future]['name'] for future in futures if not future.done()]}")
+            # ProcessPoolExecutor has no public way to stop running tasks before Python 3.14
+            for process in list(executor._processes.values()):
+                process.terminate()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return results
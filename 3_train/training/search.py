@@ -0,0 +1,278 @@
+import json
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+from sklearn.model_selection import KFold, train_test_split
+from threadpoolctl import threadpool_limits
+from training.data import find_cleaned_data, prepare_data
+from training.models import MODEL_CLASSES
+from training.pipeline import CLEANING_RESULTS_FOLDER, TRAIN_FOLDER, create_experiment_folder, load_model_params, run
+from training.scheduler import THREAD_PARAMS, SharedArrays, attach_arrays
+
+# share of the budget kept for fitting the best configurations on the full training set
+FINAL_FIT_SHARE = 0.2
+# a final fit also predicts the test set, computes importances and saves the model,
+# estimated fit times are multiplied by this
+FINAL_FIT_MARGIN = 1.5
+EARLY_STOPPING_ROUNDS = 50
+
+# boosting models stopped early on a validation part of each fold,
+# class: param holding the number of iterations
+EARLY_STOPPING_PARAMS = {
+    "XGBRegressor": "n_estimators",
+    "LGBMRegressor": "n_estimators",
+    "CatBoostRegressor": "iterations",
+    "HistGradientBoostingRegressor": "max_iter",
+    "GradientBoostingRegressor": "n_estimators",
+}
+
+
+# search space entries: a list of choices or {"low", "high", "log": bool, "type": "int" | "float"}
+def sample_params(space, rng):
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            params[name] = spec[rng.integers(len(spec))]
+            continue
+
+        low, high = spec["low"], spec["high"]
+        if spec.get("log"):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        params[name] = int(round(value)) if spec.get("type") == "int" else float(value)
+    return params
+
+
+# fit with early stopping where the library supports it, returns the model and iterations used
+def fit_with_early_stopping(model_class, params, X, y):
+    if model_class not in EARLY_STOPPING_PARAMS:
+        model = MODEL_CLASSES[model_class](**params)
+        model.fit(X, y)
+        return model, None
+
+    if model_class == "HistGradientBoostingRegressor":
+        model = MODEL_CLASSES[model_class](**{**params, "early_stopping": True, "n_iter_no_change": EARLY_STOPPING_ROUNDS})
+        model.fit(X, y)
+        return model, int(model.n_iter_)
+    if model_class == "GradientBoostingRegressor":
+        model = MODEL_CLASSES[model_class](**{**params, "n_iter_no_change": EARLY_STOPPING_ROUNDS})
+        model.fit(X, y)
+        return model, int(model.n_estimators_)
+
+    X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=0.1, random_state=42)
+    if model_class == "XGBRegressor":
+        model = MODEL_CLASSES[model_class](**{**params, "early_stopping_rounds": EARLY_STOPPING_ROUNDS})
+        model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+        return model, int(model.best_iteration) + 1
+    if model_class == "LGBMRegressor":
+        from lightgbm import early_stopping
+        model = MODEL_CLASSES[model_class](**params)
+        model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], callbacks=[early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        return model, int(model.best_iteration_)
+
+    # catboost_info is not written, many workers would write it at the same time
+    model = MODEL_CLASSES[model_class](
+        **{**params, "early_stopping_rounds": EARLY_STOPPING_ROUNDS, "allow_writing_files": False}
+    )
+    model.fit(X_fit, y_fit, eval_set=(X_val, y_val))
+    return model, int(model.get_best_iteration()) + 1
+
+
+# shared training data attached once per worker process
+_arrays = None
+_blocks = None
+
+
+def init_worker(specs):
+    global _arrays, _blocks
+    _arrays, _blocks = attach_arrays(specs)
+    # configurations run in parallel, each fit gets a single thread
+    threadpool_limits(limits=1)
+
+
+# one fold of one configuration, scored with RMSE on the price scale like the final training.
+# Returns the RMSE, the iterations used and the fit time in seconds.
+def evaluate_fold(model_class, params, rows, fold, n_folds):
+    X = _arrays["X_train"][_arrays["order"][:rows]]
+    y = _arrays["y_train"][_arrays["order"][:rows]]
+    train_index, test_index = list(KFold(n_folds, shuffle=True, random_state=42).split(X))[fold]
+
+    start = time.perf_counter()
+    model, iterations = fit_with_early_stopping(model_class, params, X[train_index], y[train_index])
+    fit_seconds = time.perf_counter() - start
+    y_pred = np.expm1(model.predict(X[test_index]))
+    rmse = float(np.sqrt(np.mean((np.expm1(y[test_index]) - y_pred) ** 2)))
+    return rmse, iterations, fit_seconds
+
+
+# rows used in every rung, the last rung uses the whole training set
+def rung_sizes(n_rows, n_configs, eta, min_rows):
+    n_rungs = max(1, int(math.log(n_configs, eta)) + 1)
+    sizes = [int(n_rows / eta ** (n_rungs - 1 - rung)) for rung in range(n_rungs)]
+    return [size for size in sizes if size >= min_rows] or [n_rows]
+
+
+# successive halving: all configurations on a small sample, the best 1/eta of them
+# on eta times more rows, until the full training set or the deadline is reached
+def successive_halving(name, entry, pool, n_rows, deadline, n_configs=27, eta=3, n_folds=5, min_rows=200, seed=42):
+    rng = np.random.default_rng(seed)
+    model_class = entry["model"]
+    thread_param = THREAD_PARAMS.get(model_class)
+
+    configs = [{}] + [sample_params(entry["search"], rng) for _ in range(n_configs - 1)]
+    candidates = [{**entry["params"], **config} for config in configs]
+    if thread_param:
+        candidates = [{**params, thread_param: 1} for params in candidates]
+
+    trials = []
+    best = None
+    for rows in rung_sizes(n_rows, n_configs, eta, min_rows):
+        jobs = {
+            (i, fold): pool.apply_async(evaluate_fold, (model_class, params, rows, fold, n_folds))
+            for i, params in enumerate(candidates) for fold in range(n_folds)
+        }
+
+        scores = []
+        for i, params in enumerate(candidates):
+            fold_results = []
+            for fold in range(n_folds):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    fold_results.append(jobs[(i, fold)].get(timeout=remaining))
+                except multiprocessing.TimeoutError:
+                    break
+                except Exception as e:
+                    print(f"{name} - configuration failed: {e!r}")
+                    break
+            if len(fold_results) < n_folds:
+                continue
+
+            rmse = float(np.mean([result[0] for result in fold_results]))
+            iterations = [result[1] for result in fold_results if result[1] is not None]
+            fit_seconds = float(np.median([result[2] for result in fold_results]))
+            scores.append((rmse, i, int(np.median(iterations)) if iterations else None, fit_seconds))
+            trials.append({"params": params, "rows": rows, "RMSE": rmse, "fit_seconds": fit_seconds})
+
+        if not scores:
+            break
+
+        scores.sort(key=lambda score: score[0])
+        rmse, i, iterations, fit_seconds = scores[0]
+        # a fold is fitted on (n_folds - 1) / n_folds of the rung's rows
+        best = {"params": dict(candidates[i]), "rows": rows, "RMSE": rmse, "fit_seconds": fit_seconds,
+                "fit_rows": rows * (n_folds - 1) // n_folds}
+        if iterations is not None:
+            best["params"][EARLY_STOPPING_PARAMS[model_class]] = iterations
+        print(f"{name} - {len(scores)} configurations on {rows} rows, best CV RMSE: {rmse:.2f}")
+
+        if time.monotonic() >= deadline:
+            print(f"{name} - search budget used up")
+            break
+        candidates = [candidates[i] for _, i, _, _ in scores[:max(1, len(scores) // eta)]]
+
+    if best and thread_param:
+        best["params"].pop(thread_param)
+    return best, trials
+
+
+# seconds to fit the best configuration on n_rows, from its fold fits in the last rung:
+# fit time taken as linear in the number of rows
+def estimate_final_fit(best, n_rows):
+    return best["fit_seconds"] * n_rows / max(best["fit_rows"], 1) * FINAL_FIT_MARGIN
+
+
+# models whose final fits end within the remaining time, lowest CV RMSE first. The fits
+# run in parallel on n_cores, so they take about the longest fit or the sum over n_cores.
+def plan_final_fits(estimates, cv_rmse, remaining, n_cores):
+    selected = []
+    for name in sorted(estimates, key=lambda name: cv_rmse[name]):
+        costs = [estimates[other] for other in selected + [name]]
+        if max(max(costs), sum(costs) / n_cores) <= remaining:
+            selected.append(name)
+    return selected
+
+
+# searches every selected model with a search space, sharing the budget between them,
+# then trains the best configurations as a new experiment. The final fits are planned
+# from the search timings and stopped at the end of the budget.
+def run_search(budget, models=None, data_path=None, params_path=None, results_folder=None, cache_folder=None,
+               n_cores=None, n_configs=27, eta=3, n_folds=5):
+    start = time.monotonic()
+    params_path = params_path or os.path.join(TRAIN_FOLDER, "model_params.json")
+    results_folder = results_folder or os.path.join(TRAIN_FOLDER, "results")
+    cache_folder = cache_folder or os.path.join(TRAIN_FOLDER, "cache")
+    data_path = data_path or find_cleaned_data(CLEANING_RESULTS_FOLDER)
+    n_cores = n_cores or os.cpu_count() or 1
+
+    model_params = load_model_params(params_path, models)
+    searched = [name for name in model_params if "search" in model_params[name]]
+    if not searched:
+        raise ValueError(f"No selected model declares a search space in {params_path}")
+
+    data = prepare_data(data_path, cache_folder)
+    arrays = {
+        "X_train": data["X_train"],
+        "y_train": np.log1p(data["y_train"]),
+        # fixed row order, every rung uses a prefix of it so samples are nested
+        "order": np.random.default_rng(42).permutation(len(data["X_train"]))
+    }
+
+    search_deadline = start + budget * (1 - FINAL_FIT_SHARE)
+    best_params = {}
+    search_results = {}
+    with SharedArrays(arrays) as shared:
+        for i, name in enumerate(searched):
+            # unused time of a model goes to the next ones
+            deadline = time.monotonic() + (search_deadline - time.monotonic()) / (len(searched) - i)
+            pool = multiprocessing.Pool(n_cores, initializer=init_worker, initargs=(shared.specs,))
+            try:
+                best, trials = successive_halving(
+                    name, model_params[name], pool, len(data["X_train"]), deadline, n_configs, eta, n_folds
+                )
+            finally:
+                # evaluations still running after the deadline are stopped
+                pool.terminate()
+                pool.join()
+
+            search_results[name] = {"best": best, "trials": trials}
+            if best:
+                best_params[name] = {"model": model_params[name]["model"], "params": best["params"]}
+            else:
+                print(f"{name} - no configuration finished within the budget")
+
+    if not best_params:
+        raise RuntimeError("No configuration finished within the budget, increase it")
+
+    deadline = start + budget
+    estimates = {name: estimate_final_fit(search_results[name]["best"], len(data["X_train"])) for name in best_params}
+    final_fits = plan_final_fits(
+        estimates, {name: search_results[name]["best"]["RMSE"] for name in best_params},
+        deadline - time.monotonic(), n_cores
+    )
+    for name in best_params:
+        search_results[name]["final_fit"] = {"estimated_seconds": estimates[name], "skipped": name not in final_fits}
+        if name not in final_fits:
+            print(f"{name} - final fit skipped, estimated {estimates[name]:.0f} s doesn't fit in the budget")
+
+    experiment_folder = create_experiment_folder(results_folder)
+    searched_params_path = os.path.join(experiment_folder, "model_params.json")
+    with open(searched_params_path, 'w') as f:
+        json.dump(best_params, f, indent=4)
+    with open(os.path.join(experiment_folder, "search.json"), 'w') as f:
+        json.dump(search_results, f, indent=4)
+    print(f"Best configurations saved to {searched_params_path}, "
+          f"search took {time.monotonic() - start:.0f} s of {budget} s")
+
+    if not final_fits:
+        raise RuntimeError(f"No final fit fits in the budget, train the configurations of {searched_params_path} "
+                           f"with --params or increase the budget")
+    return run(
+        models=final_fits, data_path=data_path, experiment_id=os.path.basename(experiment_folder),
+        params_path=searched_params_path, results_folder=results_folder, cache_folder=cache_folder,
+        n_cores=n_cores, deadline=deadline
+    )
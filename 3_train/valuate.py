@@ -0,0 +1,221 @@
+import argparse
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from threadpoolctl import threadpool_limits
+
+# cleaning functions are shared with the cleaning stage, the feature transform with
+# the app and the prediction service
+CLEANING_FOLDER = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '2_clean_data'))
+APP_FOLDER = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+sys.path.extend([CLEANING_FOLDER, APP_FOLDER])
+from cleaning.basic_cleaning import clean_listings  # noqa: E402
+from util_functions.feature_transform import listings_from_raw, load_feature_transform, transform_listings  # noqa: E402
+from util_functions.model_loader import find_best_model, load_model_file  # noqa: E402
+from training.compiled_trees import load_compiled  # noqa: E402
+
+ROW_COLUMN = 'row'
+PREDICTION_COLUMN = 'Predicted price'
+
+# model, scaler and feature transform of a worker process, loaded once by init_worker
+worker_state = {}
+
+
+# native model files by extension, anything else is a joblib pickle
+MODEL_FORMATS = {'.txt': 'lightgbm', '.ubj': 'xgboost', '.cbm': 'catboost'}
+
+
+def init_worker(model_path, model_format, scaler_path, transform_path):
+    # every worker predicts with one thread, the pool provides the parallelism
+    worker_state['threads'] = threadpool_limits(1)
+    # compiled trees saved by benchmark_predict.py --save are verified against the model and faster
+    worker_state['model'] = load_compiled(model_path) or load_model_file(model_path, model_format)
+    worker_state['scaler'] = joblib.load(scaler_path)
+    worker_state['transform'] = load_feature_transform(transform_path)
+
+
+# predicted prices of scaled rows. If the model rejects the batch, the rows are valued
+# one by one, so a row it can't take costs only itself (NaN price).
+def predict_prices(model, rows):
+    try:
+        return np.asarray(model.predict(rows), dtype=np.float64)
+    except Exception:
+        prices = np.full(len(rows), np.nan)
+        for i in range(len(rows)):
+            try:
+                prices[i] = np.asarray(model.predict(rows[i:i + 1]), dtype=np.float64)[0]
+            except Exception:
+                pass
+        return prices
+
+
+# cleans, encodes and values one chunk. Rows removed by cleaning are not returned, nor
+# rows with invalid model input (missing or unparsable numbers, zero rooms or land area
+# giving infinite ratios) or without a finite prediction; the second value counts these.
+def value_chunk(chunk, keep_columns):
+    transform = worker_state['transform']
+    listings = clean_listings(chunk, transform['raw_columns']['renamed'])
+    features = transform_listings(transform, listings_from_raw(transform, listings))
+
+    valid = np.isfinite(features.to_numpy()).all(axis=1)
+    listings, features = listings[valid], features[valid]
+    prices = np.zeros(0)
+    if len(listings):
+        scaler = worker_state['scaler']
+        if not hasattr(scaler, 'feature_names_in_'):
+            features = features.to_numpy()
+        prices = np.expm1(predict_prices(worker_state['model'], scaler.transform(features)))
+
+    predicted = np.isfinite(prices)
+    result = listings.loc[predicted, [col for col in keep_columns if col in listings]]
+    result.insert(0, ROW_COLUMN, result.index)
+    result[PREDICTION_COLUMN] = prices[predicted]
+    return result.reset_index(drop=True), int((~valid).sum() + (~predicted).sum())
+
+
+# chunks of the input with the index set to the row number in the file
+def read_chunks(path, chunk_size, separator):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        chunks = pd.read_csv(path, sep=separator, chunksize=chunk_size)
+    elif extension in ('.jsonl', '.ndjson'):
+        chunks = pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+    elif extension == '.parquet':
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size))
+    else:
+        raise ValueError(f"Unsupported input format '{extension}', use .csv, .jsonl or .parquet")
+
+    start = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+# appends result chunks to a .csv, .jsonl or .parquet file as they arrive
+class ResultWriter:
+    def __init__(self, path, separator):
+        self.separator = separator
+        self.extension = os.path.splitext(path)[1].lower()
+        if self.extension not in ('.csv', '.jsonl', '.parquet'):
+            raise ValueError(f"Unsupported output format '{self.extension}', use .csv, .jsonl or .parquet")
+        self.path = path
+        self.file = None if self.extension == '.parquet' else open(path, 'w', encoding='utf-8', newline='')
+        self.parquet_writer = None
+        self.chunks = 0
+        self.rows = 0
+
+    def write(self, result):
+        if self.extension == '.parquet':
+            table = pa.Table.from_pandas(result, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table.cast(self.parquet_writer.schema))
+        elif self.extension == '.csv':
+            result.to_csv(self.file, sep=self.separator, index=False, header=self.chunks == 0)
+        elif len(result):
+            lines = result.to_json(orient='records', lines=True, force_ascii=False)
+            self.file.write(lines if lines.endswith('\n') else lines + '\n')
+        self.chunks += 1
+        self.rows += len(result)
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        if self.file is not None:
+            self.file.close()
+
+
+def peak_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(who).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+# values every listing of a scrape or a partner file with one trained model. The input is
+# read in chunks and at most two chunks per worker are in flight, so memory stays bounded
+# whatever the file size.
+def main():
+    parser = argparse.ArgumentParser(description='Value listings of a .csv, .jsonl or .parquet file with a trained model')
+    parser.add_argument('input', help='raw listings, with the columns of the scraped data')
+    parser.add_argument('output', help='.csv, .jsonl or .parquet file for the valuations')
+    parser.add_argument('--model-folder', default='best_results',
+                        help='folder with scaler.pkl and feature_transform.json, best_results by default')
+    parser.add_argument('--model', help='model file, the best model of --model-folder by default')
+    parser.add_argument('--chunk-size', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--keep', nargs='*', default=['link'], help='input columns copied to the output')
+    parser.add_argument('--separator', default=';', help='separator of csv input and output')
+    args = parser.parse_args()
+    # the output has its own columns under these names
+    clashing = [col for col in args.keep if col in (ROW_COLUMN, PREDICTION_COLUMN)]
+    if clashing:
+        parser.error(f"--keep can't include {clashing}, the output uses these column names")
+
+    if args.model:
+        model_path = args.model
+        model_format = MODEL_FORMATS.get(os.path.splitext(model_path)[1].lower(), 'joblib')
+    else:
+        model_name, model_path, model_format = find_best_model(args.model_folder)
+        print(f"Valuing with {model_name} from {model_path}")
+    if load_compiled(model_path) is not None:
+        print("Using the compiled trees saved by benchmark_predict.py")
+    transform_path = os.path.join(args.model_folder, 'feature_transform.json')
+    if not os.path.exists(transform_path):
+        transform_path = os.path.join(CLEANING_FOLDER, 'results', 'feature_transform.json')
+    # fails here with a clear error instead of in every worker
+    if 'raw_columns' not in load_feature_transform(transform_path):
+        raise ValueError("Feature transform has no raw columns, run the cleaning stage again")
+
+    start = time.perf_counter()
+    input_rows = 0
+    rejected_rows = 0
+    failed_rows = 0
+    writer = ResultWriter(args.output, args.separator)
+    pending = deque()
+
+    # a chunk that fails (ex. a column of unexpected type) is reported and skipped,
+    # the run goes on with the next one
+    def write_next():
+        nonlocal rejected_rows, failed_rows
+        future, first_row, rows = pending.popleft()
+        try:
+            result, rejected = future.result()
+        except Exception as error:
+            print(f"Rows {first_row:,}-{first_row + rows - 1:,} not valued: {type(error).__name__}: {error}")
+            failed_rows += rows
+            return
+        writer.write(result)
+        rejected_rows += rejected
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers, initializer=init_worker,
+        initargs=(model_path, model_format, os.path.join(args.model_folder, 'scaler.pkl'), transform_path)
+    ) as executor:
+        for chunk in read_chunks(args.input, args.chunk_size, args.separator):
+            pending.append((executor.submit(value_chunk, chunk, args.keep), input_rows, len(chunk)))
+            input_rows += len(chunk)
+            # results are written in input order
+            while len(pending) >= 2 * args.workers:
+                write_next()
+        while pending:
+            write_next()
+    writer.close()
+
+    elapsed = time.perf_counter() - start
+    removed_rows = input_rows - writer.rows - rejected_rows - failed_rows
+    print(f"Valued {writer.rows:,} of {input_rows:,} listings in {elapsed:.1f}s ({input_rows / elapsed:,.0f} rows/s), "
+          f"{removed_rows:,} removed by cleaning, {rejected_rows:,} with invalid model input, {failed_rows:,} in failed chunks")
+    print(f"Peak RSS: main process {peak_rss_mb(resource.RUSAGE_SELF):,.0f} MB, "
+          f"largest worker {peak_rss_mb(resource.RUSAGE_CHILDREN):,.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -18,7 +18,7 @@ selected_trainig = st.selectbox(
     format_func=lambda x: x.replace("t", "trainig ")
 )
 
-trainig_results = pd.read_json(f'{training_results_path}/{selected_trainig}/results.json')
+trainig_results = pd.DataFrame(get_data.load_results(f'{training_results_path}/{selected_trainig}/results.json'))
 trainig_results.set_index('Model', inplace=True)
 trainig_results.sort_values(by='MAE', ascending=True, inplace=True)
 st.write(f"#### Trainig results for {selected_trainig.replace('t', 'training ')}")
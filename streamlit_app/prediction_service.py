@@ -0,0 +1,157 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from util_functions.feature_transform import load_feature_transform, transform_listings
+from util_functions.micro_batcher import MicroBatcher
+from util_functions.model_loader import find_best_model, load_manifest, load_model_file, load_scaler, models_folder
+
+# batch prediction service for one trained model, started from the repository root with
+#   PREDICTION_TRAINING=3_train/results/t1 PREDICTION_MODEL=LightGBM uvicorn --app-dir streamlit_app prediction_service:app
+TRAINING_PATH = os.environ.get('PREDICTION_TRAINING', '3_train/best_results')
+MODEL_NAME = os.environ.get('PREDICTION_MODEL')
+MAX_BATCH_ROWS = int(os.environ.get('PREDICTION_MAX_BATCH_ROWS', 4096))
+MAX_WAIT_MS = float(os.environ.get('PREDICTION_MAX_WAIT_MS', 5))
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+
+# model, scaler, feature transform and MAE of a training or of best_results, loaded once
+# when the service starts. Without model_name the best model of the manifest is used.
+class Predictor:
+    def __init__(self, training_path, model_name=None):
+        manifest = load_manifest(training_path)
+        if manifest is not None and model_name is not None and model_name not in manifest['models']:
+            raise ValueError(f"Model {model_name} not found in the manifest of {training_path}")
+
+        if model_name is None:
+            model_name, model_path, model_format = find_best_model(training_path)
+        elif manifest is not None:
+            entry = manifest['models'][model_name]
+            model_path, model_format = os.path.join(models_folder(training_path), entry['file']), entry['format']
+        else:
+            # trainings made before the manifest was introduced
+            model_path, model_format = os.path.join(models_folder(training_path), f"{model_name}.pkl"), 'joblib'
+        if not os.path.isfile(model_path):
+            raise ValueError(f"Model file {model_path} not found")
+        self.model = load_model_file(model_path, model_format)
+
+        if manifest is not None and model_name in manifest['models']:
+            self.scaler = load_scaler(manifest)
+            self.mae = manifest['models'][model_name]['metrics']['MAE']
+        else:
+            self.scaler = joblib.load(os.path.join(training_path, 'scaler.pkl'))
+            with open(os.path.join(training_path, 'results.json'), 'r') as f:
+                self.mae = next(
+                    (result['MAE'] for result in json.load(f) if result['Model'].replace(' ', '_') == model_name), None
+                )
+            if self.mae is None:
+                raise ValueError(f"Model {model_name} has no results in {training_path}/results.json")
+
+        transform_path = os.path.join(training_path, 'feature_transform.json')
+        if not os.path.isfile(transform_path):
+            transform_path = '2_clean_data/results/feature_transform.json'
+        self.transform = load_feature_transform(transform_path)
+        self.model_name = model_name
+        self.training_path = training_path
+
+    def missing_columns(self, listings):
+        return [feature for feature in self.transform['numeric_features'] if feature not in listings]
+
+    # same features as the input form of price_prediction.py
+    def features(self, listings):
+        return transform_listings(self.transform, listings)
+
+    # rows the model can't take: a missing or unparsable number, or zero rooms or land
+    # area giving an infinite ratio
+    @staticmethod
+    def invalid_rows(features):
+        return np.flatnonzero(~np.isfinite(features.to_numpy()).all(axis=1)).tolist()
+
+    # price with the same interval as the app: prediction +- MAE/2.
+    # Returns an array of rows (price, lower, upper).
+    def predict(self, features):
+        prices = np.expm1(np.asarray(self.model.predict(self.scaler.transform(features)), dtype=np.float64))
+        return np.column_stack([prices, prices - self.mae / 2, prices + self.mae / 2])
+
+
+# a listing, a list of listings or {"listings": [...]} as JSON, or an Arrow IPC stream
+# with one row per listing (multiple choice features as lists or ", " joined strings)
+async def read_listings(request):
+    body = await request.body()
+    if request.headers.get('content-type', '').startswith(ARROW_STREAM):
+        return pa.ipc.open_stream(body).read_all().to_pandas(), True
+
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get('listings', [payload])
+    return pd.DataFrame(payload), False
+
+
+def write_predictions(predictions, arrow):
+    columns = {'price': predictions[:, 0], 'lower': predictions[:, 1], 'upper': predictions[:, 2]}
+    if not arrow:
+        # JSON has no NaN or infinity, a price the model couldn't give is null
+        return JSONResponse({
+            key: [value if np.isfinite(value) else None for value in values.tolist()] for key, values in columns.items()
+        })
+
+    table = pa.table(columns)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue(), media_type=ARROW_STREAM)
+
+
+async def predict(request):
+    try:
+        listings, arrow = await read_listings(request)
+    except (ValueError, pa.ArrowInvalid) as error:
+        return JSONResponse({'error': f"Invalid payload: {error}"}, status_code=400)
+
+    if listings.empty:
+        return write_predictions(np.zeros((0, 3)), arrow)
+    predictor = request.app.state.predictor
+    missing = predictor.missing_columns(listings)
+    if missing:
+        return JSONResponse({'error': f"Missing features: {missing}"}, status_code=422)
+
+    # checked before batching, an invalid listing fails only its own request
+    features = await asyncio.to_thread(predictor.features, listings)
+    invalid = predictor.invalid_rows(features)
+    if invalid:
+        return JSONResponse({'error': f"Invalid features in listings {invalid}"}, status_code=422)
+
+    predictions = await request.app.state.batcher.predict(features)
+    return write_predictions(predictions, arrow)
+
+
+async def health(request):
+    predictor = request.app.state.predictor
+    return JSONResponse({
+        'training': predictor.training_path, 'model': predictor.model_name, 'mae': predictor.mae,
+        'features': predictor.transform['numeric_features'] + list(predictor.transform['multilabel_features'])
+    })
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    app.state.predictor = Predictor(TRAINING_PATH, MODEL_NAME)
+    app.state.batcher = MicroBatcher(app.state.predictor.predict, MAX_BATCH_ROWS, MAX_WAIT_MS)
+    await app.state.batcher.start()
+    yield
+    await app.state.batcher.stop()
+
+
+app = Starlette(
+    routes=[Route('/predict', predict, methods=['POST']), Route('/health', health, methods=['GET'])],
+    lifespan=lifespan
+)
@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
 from util_functions.functions import *
 from util_functions.form import *
 from util_functions import get_data
@@ -25,8 +24,9 @@ selected_model = st.selectbox(
 )
 
 
-model = joblib.load(models_dict[f"{selected_trainig}/{selected_model}"]["model_path"])
-scaler = joblib.load(models_dict[f"{selected_trainig}/{selected_model}"]["scaler_path"])
+model = get_data.get_model(models_dict[f"{selected_trainig}/{selected_model}"])
+scaler = get_data.get_scaler(models_dict[f"{selected_trainig}/{selected_model}"])
+feature_transform = get_data.get_feature_transform(models_dict[f"{selected_trainig}/{selected_model}"]["transform_path"])
 
 model_name = selected_model
 mae = get_data.get_mae_from_results(models_dict[f"{selected_trainig}/{selected_model}"]["results_path"], model_name)
@@ -38,7 +38,7 @@ if mae is None:
 
 st.title("🏠 Property price prediction")
 
-input_df = generate_input_form()
+input_df = generate_input_form(feature_transform)
 st.write("##### Model used: :green[" + selected_model + "] from :green["+selected_trainig.replace('t', 'training ')+']')
 st.write("### Data entered(as dataframe):")
 st.dataframe(input_df)
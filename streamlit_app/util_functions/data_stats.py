@@ -1,69 +1,85 @@
-from sklearn.model_selection import train_test_split
+import io
 import streamlit as st
 import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+# charts of the dataset explorer, drawn from the statistics precomputed by the
+# cleaning stage (see get_data.load_data_statistics). Drawing takes longer than
+# loading the statistics, so every chart is cached as an image and a widget change
+# only draws the chart it affects.
 
-def plot_correlation_heatmap_streamlit(data, target_column, top_n=10):
-    numeric_data = data.select_dtypes(include=[np.number])
-    correlations = numeric_data.corr()[target_column].abs().sort_values(ascending=False)
+
+# st.image scales down (and encodes again, on every rerun) images wider than 1460 px
+MAX_IMAGE_WIDTH = 1400
+
+
+def figure_png(fig):
+    buffer = io.BytesIO()
+    dpi = min(200, MAX_IMAGE_WIDTH / fig.get_size_inches()[0])
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+# correlation: correlation matrix of the numeric columns of the cleaned data
+@st.cache_data(show_spinner=False, max_entries=64)
+def correlation_heatmap_png(correlation, target_column, top_n=10):
+    correlations = correlation[target_column].abs().sort_values(ascending=False)
     top_features = correlations.index[:top_n+1]
 
     fig, ax = plt.subplots(figsize=(15, 15))
-    sns.heatmap(numeric_data[top_features].corr(), annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5, ax=ax)
+    sns.heatmap(correlation.loc[top_features, top_features], annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5, ax=ax)
     ax.set_title(f'Top {top_n} Most Correlated Features Including {target_column}')
-    st.pyplot(fig)
+    return figure_png(fig)
 
-def plot_price_distribution_streamlit(data, target_column):
+# histogram: bin counts and edges of the price, with a density curve
+@st.cache_data(show_spinner=False, max_entries=64)
+def price_distribution_png(histogram):
+    edges = np.array(histogram['edges']) / 1_000_000
     fig, ax = plt.subplots(figsize=(10, 6))
-    sns.histplot(data[target_column] / 1_000_000, kde=True, bins=30, color='skyblue', ax=ax)
+    ax.bar(edges[:-1], histogram['counts'], width=np.diff(edges), align='edge', color='skyblue', edgecolor='white')
+    ax.plot(np.array(histogram['kde_x']) / 1_000_000, histogram['kde_y'], color='skyblue')
     ax.set_title('Distribution of Price (in million PLN)')
     ax.set_xlabel('Price (Million PLN)')
     ax.set_ylabel('Frequency')
-    st.pyplot(fig)
+    return figure_png(fig)
 
-def plot_binary_feature_counts_streamlit(data, feature_prefix):
-    binary_features = [col for col in data.columns if col.startswith(feature_prefix)]
-    counts = data[binary_features].sum().sort_values(ascending=False)
+# feature_groups: count, average and median price and average price per sqm of every
+# one-hot column, by prefix
+@st.cache_data(show_spinner=False, max_entries=64)
+def binary_feature_counts_png(feature_groups, feature_prefix):
+    counts = feature_groups[feature_groups['Prefix'] == feature_prefix].sort_values(by='Count', ascending=False)
 
     fig, ax = plt.subplots(figsize=(16, 6))
-    sns.barplot(x=counts.values, y=counts.index, palette='viridis', ax=ax)
+    sns.barplot(x=counts['Count'].values, y=counts['Feature'].values, palette='viridis', ax=ax)
     ax.set_title(f'Number of Listings for Each {feature_prefix} Feature')
     ax.set_xlabel('Count')
-    st.pyplot(fig)
-
-def plot_price_by_feature_streamlit(data, feature_prefix):
-    relevant_columns = [col for col in data.columns if col.startswith(feature_prefix)]
-    
-    results = []
-    for col in relevant_columns:
-        avg_price = data[data[col] == 1]['Price'].mean() 
-        results.append({'Feature': col, 'Average Price': avg_price})
-
-    results_df = pd.DataFrame(results).sort_values(by='Average Price', ascending=False)
-    
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.barplot(x='Average Price', y='Feature', data=results_df, palette='coolwarm', ax=ax)
-    ax.set_title(f'Average Price by Binary Features ({feature_prefix})')
-    ax.set_xlabel('Average Price (Million PLN)')
-    ax.set_ylabel('Feature')
-    st.pyplot(fig)
+    return figure_png(fig)
+
+# price metrics of feature_groups that can be compared between features
+PRICE_METRICS = ['Average Price', 'Median Price', 'Average Price per sqm']
+
 
+@st.cache_data(show_spinner=False, max_entries=64)
+def price_by_feature_png(feature_groups, feature_prefix, metric='Average Price'):
+    results_df = feature_groups[feature_groups['Prefix'] == feature_prefix].sort_values(by=metric, ascending=False)
 
-def plot_offers_and_price_by_region(data):
-    regions = [col for col in data.columns if col.startswith('Województwo')]
-    region_stats = []
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.barplot(x=metric, y='Feature', data=results_df, palette='coolwarm', ax=ax)
+    ax.set_title(f'{metric} by Binary Features ({feature_prefix})')
+    ax.set_xlabel(f'{metric} (PLN)')
+    ax.set_ylabel('Feature')
+    return figure_png(fig)
 
-    for region in regions:
-        region_name = region.replace('Województwo ', '')
-        region_data = data[data[region] == 1]
-        num_offers = len(region_data)
-        avg_price = region_data['Price'].mean() if num_offers > 0 else 0
-        region_stats.append([region_name, num_offers, avg_price])
 
-    df = pd.DataFrame(region_stats, columns=['Region', 'Number of Offers', 'Average Price']).sort_values(by='Number of Offers', ascending=False)
+@st.cache_data(show_spinner=False, max_entries=64)
+def offers_and_price_by_region_png(feature_groups):
+    df = feature_groups[feature_groups['Prefix'] == 'Województwo'].copy()
+    df['Region'] = df['Feature'].str.replace('Województwo ', '')
+    df['Average Price'] = df['Average Price'].fillna(0)
+    df = df.rename(columns={'Count': 'Number of Offers'}).sort_values(by='Number of Offers', ascending=False)
 
     fig, ax1 = plt.subplots(figsize=(15, 6))
     sns.barplot(x='Region', y='Number of Offers', data=df, palette='viridis', ax=ax1)
@@ -77,4 +93,24 @@ def plot_offers_and_price_by_region(data):
     plt.title('Number of Offers and Average Price by Region')
     plt.tight_layout()
 
-    st.pyplot(fig)
+    return figure_png(fig)
+
+
+def plot_correlation_heatmap_streamlit(correlation, target_column, top_n=10):
+    st.image(correlation_heatmap_png(correlation, target_column, top_n), width='stretch')
+
+
+def plot_price_distribution_streamlit(histogram):
+    st.image(price_distribution_png(histogram), width='stretch')
+
+
+def plot_binary_feature_counts_streamlit(feature_groups, feature_prefix):
+    st.image(binary_feature_counts_png(feature_groups, feature_prefix), width='stretch')
+
+
+def plot_price_by_feature_streamlit(feature_groups, feature_prefix, metric='Average Price'):
+    st.image(price_by_feature_png(feature_groups, feature_prefix, metric), width='stretch')
+
+
+def plot_offers_and_price_by_region(feature_groups):
+    st.image(offers_and_price_by_region_png(feature_groups), width='stretch')
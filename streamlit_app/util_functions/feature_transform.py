@@ -0,0 +1,96 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree, KDTree
+
+# feature_transform.json versions this code can read
+SUPPORTED_VERSIONS = [1]
+
+
+# feature transform written by the cleaning stage (2_clean_data/results)
+# and copied next to scaler.pkl by every training
+def load_feature_transform(transform_path):
+    with open(transform_path, 'r', encoding='utf-8') as f:
+        transform = json.load(f)
+
+    if transform.get('version') not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported feature transform version: {transform.get('version')}")
+
+    clusters_path = os.path.join(os.path.dirname(transform_path), transform['location_cluster']['core_points_file'])
+    clusters = np.load(clusters_path)
+    transform['location_cluster']['core_points'] = clusters['core_points']
+    transform['location_cluster']['core_labels'] = clusters['core_labels']
+    # nearest core point lookup in O(log n) instead of refitting DBSCAN,
+    # haversine clusters keep core points in radians and need a ball tree
+    metric = transform['location_cluster'].get('metric', 'euclidean')
+    if not len(clusters['core_points']):
+        transform['location_cluster']['tree'] = None
+    elif metric == 'haversine':
+        transform['location_cluster']['tree'] = BallTree(clusters['core_points'], metric='haversine')
+    else:
+        transform['location_cluster']['tree'] = KDTree(clusters['core_points'])
+
+    return transform
+
+
+# DBSCAN label for new points: label of the nearest core point within eps, otherwise -1 (noise)
+def assign_location_clusters(transform, latitudes, longitudes):
+    clusters = transform['location_cluster']
+    points = np.column_stack([latitudes, longitudes]).astype(np.float64)
+    scaled_points = (points - np.array(clusters['scaler_mean'])) / np.array(clusters['scaler_scale'])
+
+    labels = np.full(len(points), -1, dtype=np.int64)
+    if clusters['tree'] is None or len(points) == 0:
+        return labels
+
+    distances, nearest = clusters['tree'].query(scaled_points, k=1)
+    within_eps = distances[:, 0] <= clusters['eps']
+    labels[within_eps] = clusters['core_labels'][nearest[within_eps, 0]]
+    return labels
+
+
+# listings: list of dicts (or a DataFrame) with numeric features and, for every
+# multilabel feature, its prefix mapped to a label or a list of labels
+def transform_listings(transform, listings):
+    listings = pd.DataFrame(listings).reset_index(drop=True)
+    feature_columns = transform['feature_columns']
+    column_index = {col: i for i, col in enumerate(feature_columns)}
+    matrix = np.zeros((len(listings), len(feature_columns)), dtype=np.float64)
+
+    for feature in transform['numeric_features']:
+        matrix[:, column_index[feature]] = pd.to_numeric(listings[feature], errors='coerce')
+
+    for prefix, labels in transform['multilabel_features'].items():
+        if prefix not in listings:
+            continue
+
+        # single labels and ", " joined strings are treated like lists
+        values = listings[prefix].map(
+            lambda value: value.split(', ') if isinstance(value, str) else (value if isinstance(value, (list, tuple)) else [])
+        ).explode().dropna()
+        columns = values.map({label: column_index[f"{prefix} {label}"] for label in labels})
+        known = columns.notna()
+        matrix[values.index[known], columns[known].astype(int)] = 1
+
+    for feature, (numerator, denominator) in transform['derived_features'].items():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix[:, column_index[feature]] = matrix[:, column_index[numerator]] / matrix[:, column_index[denominator]]
+
+    cluster_feature = transform['location_cluster']['feature']
+    matrix[:, column_index[cluster_feature]] = assign_location_clusters(
+        transform, matrix[:, column_index['Latitude']], matrix[:, column_index['Longitude']]
+    )
+
+    return pd.DataFrame(matrix, columns=feature_columns)
+
+
+# raw scraped listings, renamed and cleaned like the training data, in the input
+# format of transform_listings: numeric features as they are and every multilabel
+# column under its prefix. Needs a transform written with raw_columns.
+def listings_from_raw(transform, df):
+    columns = {feature: df[feature] for feature in transform['numeric_features'] if feature in df}
+    for col_name, prefix in transform['raw_columns']['multilabel'].items():
+        if col_name in df and prefix in transform['multilabel_features']:
+            columns[prefix] = df[col_name]
+    return pd.DataFrame(columns, index=df.index)
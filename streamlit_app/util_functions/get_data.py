@@ -1,22 +1,20 @@
 import json
 import os
+import joblib
+import pandas as pd
+import streamlit as st
+from util_functions.feature_transform import load_feature_transform
+from util_functions.model_loader import MANIFEST_FILE, PREDICTIONS_FILE, load_manifest, load_model_file, load_scaler
+from util_functions.model_registry import ModelRegistry
 
 def get_available_models(results_dir = '3_train/results'):
     available_models = {}
 
     for folder in os.listdir(results_dir):
-        models_dir = os.path.join(results_dir, folder, 'models')
-        results_file = os.path.join(results_dir, folder, 'results.json')
-
-        if os.path.isdir(models_dir) and os.path.isfile(results_file):
-            for file in os.listdir(models_dir):
-                if file.endswith('.pkl'):
-                    model_name = file.replace('.pkl', '')
-                    available_models[f"{folder}/{model_name}"]={
-                        "model_path": os.path.join(models_dir, file),
-                        "scaler_path": os.path.join(results_dir, folder, 'scaler.pkl'),
-                        "results_path": results_file
-                    }
+        training_path = os.path.join(results_dir, folder)
+        if os.path.isdir(os.path.join(training_path, 'models')) and os.path.isfile(os.path.join(training_path, 'results.json')):
+            for model_name, model_info in get_models_from_trainig(training_path).items():
+                available_models[f"{folder}/{model_name}"] = model_info
 
     return available_models
 
@@ -25,10 +23,23 @@ def get_trainings(results_dir = '3_train/results'):
     return os.listdir(results_dir)
 
 def get_models_from_trainig(training_path):
+    return _get_models_from_training_cached(training_path, _training_signature(training_path))
+
+
+# the model list of a training changes only when its models folder or manifest is
+# rewritten, so their modification times tell when the cached list is outdated
+def _training_signature(training_path):
+    paths = [os.path.join(training_path, 'models'), os.path.join(training_path, MANIFEST_FILE)]
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+
+@st.cache_data(show_spinner=False)
+def _get_models_from_training_cached(training_path, signature):
     available_models = {}
     models_dir = os.path.join(training_path, 'models')
     scaler_path = os.path.join(training_path, 'scaler.pkl')
     results_file = os.path.join(training_path, 'results.json')
+    manifest = load_manifest(training_path) or {"models": {}}
 
     for file in os.listdir(models_dir):
         if file.endswith('.pkl'):
@@ -36,17 +47,142 @@ def get_models_from_trainig(training_path):
             available_models[model_name]={
                 "model_path": os.path.join(models_dir, file),
                 "scaler_path": scaler_path,
-                "results_path": results_file
+                "results_path": results_file,
+                "transform_path": get_feature_transform_path(training_path),
+                "training_path": training_path
             }
 
+            # compact native model file from the manifest, if the training has one
+            entry = manifest["models"].get(model_name)
+            if entry:
+                available_models[model_name]["model_path"] = os.path.join(models_dir, entry["file"])
+                available_models[model_name]["model_format"] = entry["format"]
+
     return available_models
 
 
-def get_mae_from_results(results_path, model_name):
-    with open(results_path, 'r') as file:
-        results = json.load(file)
+# feature transform saved with the training, trainings made before it was
+# introduced use the one from the cleaning stage
+def get_feature_transform_path(training_path, default_path='2_clean_data/results/feature_transform.json'):
+    transform_path = os.path.join(training_path, 'feature_transform.json')
+    if os.path.isfile(transform_path):
+        return transform_path
+    return default_path
+
 
-    for result in results:
+def get_mae_from_results(results_path, model_name):
+    for result in load_results(results_path):
         if result["Model"] == model_name:
             return result["MAE"]
-    return None
\ No newline at end of file
+    return None
+
+
+def load_results(results_path):
+    return _load_results_cached(results_path, os.path.getmtime(results_path))
+
+
+@st.cache_data(show_spinner=False)
+def _load_results_cached(results_path, modified_time):
+    with open(results_path, 'r') as file:
+        return json.load(file)
+
+
+# predictions of every model on the held-out rows of a training, None for trainings
+# made before they were saved
+def load_test_predictions(training_path):
+    predictions_path = os.path.join(training_path, PREDICTIONS_FILE)
+    if not os.path.isfile(predictions_path):
+        return None
+    return _load_test_predictions_cached(predictions_path, os.path.getmtime(predictions_path))
+
+
+@st.cache_data(show_spinner=False)
+def _load_test_predictions_cached(predictions_path, modified_time):
+    return pd.read_parquet(predictions_path)
+
+
+# manifest of a training (model files, formats and metrics), None for trainings without one
+def get_manifest(training_path):
+    manifest_path = os.path.join(training_path, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        return None
+    return _load_manifest_cached(training_path, os.path.getmtime(manifest_path))
+
+
+@st.cache_data(show_spinner=False)
+def _load_manifest_cached(training_path, modified_time):
+    return load_manifest(training_path)
+
+
+# statistics store versions this code can read
+SUPPORTED_STATISTICS_VERSIONS = [2]
+
+
+# summaries of the raw and cleaned data written by the cleaning stage (2_clean_data/results/stats),
+# None when the cleaning stage hasn't written them yet or wrote an older version
+def load_data_statistics(stats_dir='2_clean_data/results/stats'):
+    summary_path = os.path.join(stats_dir, 'summary.json')
+    if not os.path.isfile(summary_path):
+        return None
+    statistics = _load_data_statistics_cached(stats_dir, os.path.getmtime(summary_path))
+    if statistics.get('version') not in SUPPORTED_STATISTICS_VERSIONS:
+        return None
+    return statistics
+
+
+@st.cache_data(show_spinner=False)
+def _load_data_statistics_cached(stats_dir, modified_time):
+    with open(os.path.join(stats_dir, 'summary.json'), 'r', encoding='utf-8') as f:
+        statistics = json.load(f)
+    for name in ['raw_preview', 'cleaned_preview', 'describe', 'correlation', 'feature_groups']:
+        statistics[name] = pd.read_parquet(os.path.join(stats_dir, f'{name}.parquet'))
+    return statistics
+
+
+# prefer the parquet file from the cleaning stage, fall back to csv
+def load_cleaned_data(parquet_path='2_clean_data/results/otodom_houses_cleaned.parquet',
+                      csv_path='2_clean_data/results/otodom_houses_cleaned.csv'):
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    return pd.read_csv(csv_path, delimiter=';')
+
+
+# loaded once per file version and shared by all sessions
+@st.cache_resource(show_spinner=False)
+def _load_feature_transform_cached(transform_path, modified_time):
+    return load_feature_transform(transform_path)
+
+
+def get_feature_transform(transform_path):
+    return _load_feature_transform_cached(transform_path, os.path.getmtime(transform_path))
+
+
+# memory cap of the model registry, models are evicted least recently used first
+MODEL_CACHE_MB = int(os.environ.get('MODEL_CACHE_MB', 2048))
+MODEL_CACHE_ENTRIES = int(os.environ.get('MODEL_CACHE_ENTRIES', 16))
+
+
+# one registry for the whole server, so every session reuses loaded models
+@st.cache_resource(show_spinner=False)
+def get_model_registry():
+    return ModelRegistry(MODEL_CACHE_MB * 1024 ** 2, MODEL_CACHE_ENTRIES)
+
+
+# model loaded once per file version, later reruns and switching back to it take no time
+def get_model(model_info):
+    return get_model_registry().get(model_info["model_path"], load_model_file, model_info.get("model_format", "joblib"))
+
+
+def _load_scaler(scaler_path, *manifest_path):
+    manifest = load_manifest(os.path.dirname(scaler_path))
+    if manifest is not None:
+        return load_scaler(manifest)
+    return joblib.load(scaler_path)
+
+
+def get_scaler(model_info):
+    paths = [model_info["scaler_path"]]
+    manifest_path = os.path.join(model_info["training_path"], MANIFEST_FILE)
+    if os.path.isfile(manifest_path):
+        paths.append(manifest_path)
+    return get_model_registry().get(paths, _load_scaler)
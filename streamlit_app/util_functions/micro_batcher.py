@@ -0,0 +1,80 @@
+import asyncio
+import pandas as pd
+
+
+# collects the listings of concurrent requests into one batch, so the model is called
+# once per batch instead of once per request. A batch is run when it reaches
+# max_batch_rows or max_wait_ms after its first request, whichever comes first.
+# predict_batch(DataFrame) -> array of rows, runs in a worker thread. Requests should
+# be validated before they are queued, a failed batch is retried request by request.
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_rows=4096, max_wait_ms=5):
+        self.predict_batch = predict_batch
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def predict(self, listings):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((listings, future))
+        return await future
+
+    # next batch: the first waiting request, then whatever arrives until the batch is full or the wait ran out
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+
+        while rows < self.max_batch_rows:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0 and self._queue.empty():
+                break
+            try:
+                item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            listings = pd.concat([item[0] for item in batch], ignore_index=True)
+            try:
+                predictions = await asyncio.to_thread(self.predict_batch, listings)
+            except Exception:
+                await self._run_separately(batch)
+                continue
+
+            start = 0
+            for item, future in batch:
+                end = start + len(item)
+                if not future.done():
+                    future.set_result(predictions[start:end])
+                start = end
+
+    # a failed batch is predicted again request by request, so a request the model
+    # can't take fails alone instead of failing every request batched with it
+    async def _run_separately(self, batch):
+        for listings, future in batch:
+            if future.done():
+                continue
+            try:
+                future.set_result(await asyncio.to_thread(self.predict_batch, listings))
+            except Exception as error:
+                future.set_exception(error)
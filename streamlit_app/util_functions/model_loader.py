@@ -0,0 +1,90 @@
+import json
+import os
+import joblib
+import numpy as np
+
+MANIFEST_FILE = 'manifest.json'
+PREDICTIONS_FILE = 'test_predictions.parquet'
+SUPPORTED_MANIFEST_VERSIONS = [1]
+
+
+# manifest.json written by the training, None for trainings made before it was introduced
+def load_manifest(training_path):
+    manifest_path = os.path.join(training_path, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        return None
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') not in SUPPORTED_MANIFEST_VERSIONS:
+        return None
+    return manifest
+
+
+# folder with the model files of a training, best_results holds them next to the manifest
+def models_folder(training_path):
+    models_dir = os.path.join(training_path, 'models')
+    return models_dir if os.path.isdir(models_dir) else training_path
+
+
+# model with the lowest RMSE of a training folder or of best_results: from the manifest,
+# or for folders saved before it from results.json among the pickles present.
+# Returns (model name, path, format).
+def find_best_model(training_path):
+    manifest = load_manifest(training_path)
+    if manifest is not None and manifest['models']:
+        model_name, entry = min(manifest['models'].items(), key=lambda item: item[1]['metrics']['RMSE'])
+        return model_name, os.path.join(models_folder(training_path), entry['file']), entry['format']
+
+    models_dir = models_folder(training_path)
+    saved = sorted(file[:-len('.pkl')] for file in os.listdir(models_dir) if file.endswith('.pkl') and file != 'scaler.pkl')
+    results_path = os.path.join(training_path, 'results.json')
+    results = []
+    if os.path.isfile(results_path):
+        with open(results_path, 'r') as f:
+            results = [result for result in json.load(f) if result['Model'].replace(' ', '_') in saved]
+
+    if results:
+        model_name = min(results, key=lambda result: result['RMSE'])['Model'].replace(' ', '_')
+    elif len(saved) == 1:
+        model_name = saved[0]
+    else:
+        raise ValueError(f"Can't tell the best model of {training_path}: no manifest or results.json entry for {saved}")
+    return model_name, os.path.join(models_dir, f"{model_name}.pkl"), 'joblib'
+
+
+# StandardScaler.transform from the parameters in the manifest, no pickle needed
+class ManifestScaler:
+    def __init__(self, mean, scale, feature_columns):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.feature_columns = feature_columns
+
+    def transform(self, X):
+        if hasattr(X, 'columns'):
+            X = X[self.feature_columns]
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+def load_scaler(manifest):
+    return ManifestScaler(manifest['scaler']['mean'], manifest['scaler']['scale'], manifest['feature_columns'])
+
+
+# libraries are imported only when a model of their format is loaded, so app start
+# doesn't pay for importing xgboost, lightgbm and catboost
+def load_model_file(model_path, model_format):
+    if model_format == 'lightgbm':
+        import lightgbm
+        return lightgbm.Booster(model_file=model_path)
+    if model_format == 'xgboost':
+        from xgboost import XGBRegressor
+        model = XGBRegressor()
+        model.load_model(model_path)
+        return model
+    if model_format == 'catboost':
+        from catboost import CatBoostRegressor
+        model = CatBoostRegressor()
+        model.load_model(model_path)
+        return model
+    # numpy arrays of uncompressed joblib files are memory-mapped instead of read
+    return joblib.load(model_path, mmap_mode='r')
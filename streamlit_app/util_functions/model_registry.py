@@ -0,0 +1,68 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# loaded models and scalers shared by all sessions of the app. Entries are keyed by
+# artifact path and modification time, so a retrained file is loaded again, and the
+# least recently used ones are evicted when the entry count or memory cap is exceeded.
+# Memory of an entry is estimated from the size of its files on disk.
+class ModelRegistry:
+    def __init__(self, max_bytes, max_entries=16):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+
+    # key of the current version of the files, first path is the one the entry is named after
+    @staticmethod
+    def _version(paths):
+        stats = [os.stat(path) for path in paths]
+        return tuple((path, stat.st_mtime_ns) for path, stat in zip(paths, stats)), sum(stat.st_size for stat in stats)
+
+    def get(self, paths, loader, *args):
+        paths = [paths] if isinstance(paths, str) else list(paths)
+        version, size = self._version(paths)
+        key = (version, args)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+
+        # sessions asking for the same model wait for one load instead of loading it each
+        with loading_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+
+            value = loader(*paths, *args)
+
+            with self._lock:
+                # older versions of the same files are never asked for again
+                for old_key in [old_key for old_key in self._entries if old_key[0][0][0] == paths[0]]:
+                    del self._entries[old_key]
+                self._entries[key] = (value, size)
+                self._loading_locks.pop(key, None)
+                self._evict()
+        return value
+
+    # the newest entry is kept even if it alone is over the cap
+    def _evict(self):
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.memory_usage() > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+
+    def memory_usage(self):
+        return sum(size for _, size in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
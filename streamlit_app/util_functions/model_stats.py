@@ -1,35 +1,45 @@
-from sklearn.model_selection import train_test_split
 import streamlit as st
 import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
-import joblib
-from sklearn.inspection import permutation_importance
 import json
+from util_functions.get_data import get_manifest, load_results, load_test_predictions
 
+# predictions saved by the training on its held-out rows, nothing is predicted here
 def plot_actual_vs_predicted_price(selected_model, model_name):
-    df = pd.read_csv('2_clean_data/results/otodom_houses_cleaned.csv', delimiter=';')
-    scaler = joblib.load(selected_model["scaler_path"])
-    model = joblib.load(selected_model["model_path"])
-
-    X = df.drop(columns=['Price'])
-    y = df['Price']
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-
-    X_test_scaled = scaler.transform(X_test)
+    predictions = load_test_predictions(selected_model["training_path"])
+    if predictions is None or model_name not in predictions:
+        st.info("This training has no saved test set predictions for the model, train it again to see them.")
+        return
 
+    y_test = predictions['Actual price']
     plt.figure(figsize=(10, 6))
-    sns.scatterplot(x=y_test, y=np.expm1(model.predict(X_test_scaled)), alpha=0.5)
+    sns.scatterplot(x=y_test, y=predictions[model_name], alpha=0.5)
     plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--')
     plt.xlabel("Actual Price")
     plt.ylabel("Predicted Price")
-    plt.title(f"Actual vs Predicted Price ({model_name})")
+    plt.title(f"Actual vs Predicted Price ({model_name}, {len(predictions)} test rows)")
     st.pyplot(plt)
 
+    entry = (get_manifest(selected_model["training_path"]) or {"models": {}})["models"].get(model_name, {})
+    if "residuals" in entry:
+        residuals = entry["residuals"]
+        st.write("#### Residuals (predicted - actual price)")
+        st.dataframe(pd.DataFrame([{
+            "MAE": entry["metrics"]["MAE"],
+            "RMSE": entry["metrics"]["RMSE"],
+            "R2": entry["metrics"]["R2"],
+            "Mean": residuals["mean"],
+            "Std": residuals["std"],
+            **residuals["quantiles"],
+            "Median abs. error": residuals["median_absolute_error"],
+            "Median % error": residuals["median_percentage_error"]
+        }]), hide_index=True)
+
 def plot_mae_comparison(results_path, trainig_number):
 
-    results = pd.read_json(results_path)
+    results = pd.DataFrame(load_results(results_path))
     exclude = st.checkbox("Exclude MLPRegressor", value=True)
 
     if exclude: